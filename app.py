@@ -1,152 +1,179 @@
-import streamlit as st
+import math
+import os
+import uuid
+
+import altair as alt
 import pandas as pd
-import itertools
+import streamlit as st
+
+import instrumentation
+import loaders
+from jobs import JobPool
+from lineup_index import (
+    LineupRanks,
+    extreme_lineups,
+    iter_selection,
+    load_index,
+    member_names,
+)
+from lineups import pareto_frontier
+from races import DEFAULT_WINDOW, describe_window, load_results, parse_window
 
-# Load data
-@st.cache_data
+# Load data into the entity registry, once per process. FORMULAB_WINDOW (season,
+# last:N, blend:D or baseline) picks which stored race results replace 2024 points
+def scoring_window():
+    return parse_window(os.environ.get('FORMULAB_WINDOW', DEFAULT_WINDOW))
+
+@st.cache_resource
 def load_data():
-    drivers_df = pd.read_csv('data/f1_fantasy_drivers.csv')
-    teams_df = pd.read_csv('data/f1_fantasy_teams.csv')
-    
-    # Title case for driver names
-    drivers_df['driver'] = drivers_df['driver'].str.replace('_', ' ').str.title()
-    
-    # Title case for team names
-    teams_df['team'] = teams_df['team'].str.replace('_', ' ').str.title()
-    
-    return drivers_df, teams_df
+    return loaders.load_registry(window=scoring_window())
 
-def find_best_combinations(drivers_df, teams_df, selected_drivers=None, selected_teams=None, max_cost=100, top_n=5):
-    # Create copies and rename columns
-    drivers_df = drivers_df.copy()
-    teams_df = teams_df.copy()
-    drivers_df = drivers_df.rename(columns={'points_2024': 'points'})
-    teams_df = teams_df.rename(columns={'points_2024': 'points'})
-    
-    # Calculate used budget from original dataframes
-    used_budget = 0
-    if selected_drivers:
-        used_budget += drivers_df[drivers_df['driver'].isin(selected_drivers)]['cost'].sum()
-    if selected_teams:
-        used_budget += teams_df[teams_df['team'].isin(selected_teams)]['cost'].sum()
-    remaining_budget = max_cost - used_budget
-    
-    # Calculate points from selected drivers and teams
-    selected_points = 0
-    if selected_drivers:
-        selected_points += drivers_df[drivers_df['driver'].isin(selected_drivers)]['points'].sum()
-    if selected_teams:
-        selected_points += teams_df[teams_df['team'].isin(selected_teams)]['points'].sum()
-    
-    # Filter out already selected items
-    if selected_drivers:
-        drivers_df = drivers_df[~drivers_df['driver'].isin(selected_drivers)]
-    if selected_teams:
-        teams_df = teams_df[~teams_df['team'].isin(selected_teams)]
-    
-    # Calculate remaining slots
-    remaining_drivers = 5 - (len(selected_drivers) if selected_drivers else 0)
-    remaining_teams = 2 - (len(selected_teams) if selected_teams else 0)
+@st.cache_resource
+def load_points_basis():
+    return describe_window(scoring_window(), load_results())
 
-    driver_combinations = list(itertools.combinations(drivers_df.itertuples(index=False), remaining_drivers))
-    team_combinations = list(itertools.combinations(teams_df.itertuples(index=False), remaining_teams))
+# Memory-map the precomputed lineup index, rebuilding it if the CSVs changed
+@st.cache_resource
+def load_lineup_index():
+    return load_index(load_data())
 
-    all_combinations = []
-    
-    for driver_combo in driver_combinations:
-        for team_combo in team_combinations:
-            total_cost = sum(driver.cost for driver in driver_combo) + sum(team.cost for team in team_combo)
-            if total_cost <= remaining_budget:
-                # Calculate points including both selected and new items
-                total_points = (
-                    selected_points +  # Points from pre-selected items
-                    sum(driver.points for driver in driver_combo) +  # Points from new drivers
-                    sum(team.points for team in team_combo)  # Points from new teams
-                )
-                
-                all_combinations.append((driver_combo, team_combo, total_points, total_cost))
+# Exact ranks among every lineup under the cap, from the same index
+@st.cache_resource
+def load_lineup_ranks():
+    return LineupRanks(load_lineup_index())
 
-    if not all_combinations:
-        return []  # Return empty list if no valid combinations found
+@st.cache_resource
+def load_dataset_version():
+    return load_data().digest().hex()
 
-    all_combinations.sort(key=lambda x: x[2], reverse=True)
-    return all_combinations[:top_n]
+# One worker pool for every session, so CPU only goes to each session's current query
+@st.cache_resource
+def load_job_pool():
+    return JobPool()
 
-def count_valid_combinations(drivers_df, teams_df, selected_drivers=None, selected_teams=None, max_cost=100):
-    # Create copies and rename columns
-    drivers_df = drivers_df.copy()
-    teams_df = teams_df.copy()
-    
-    # Calculate used budget from original dataframes
-    used_budget = 0
-    if selected_drivers:
-        used_budget += drivers_df[drivers_df['driver'].isin(selected_drivers)]['cost'].sum()
-    if selected_teams:
-        used_budget += teams_df[teams_df['team'].isin(selected_teams)]['cost'].sum()
-    remaining_budget = max_cost - used_budget
-    
-    # Filter out already selected items
-    if selected_drivers:
-        drivers_df = drivers_df[~drivers_df['driver'].isin(selected_drivers)]
-    if selected_teams:
-        teams_df = teams_df[~teams_df['team'].isin(selected_teams)]
-    
-    # Calculate remaining slots
-    remaining_drivers = 5 - (len(selected_drivers) if selected_drivers else 0)
-    remaining_teams = 2 - (len(selected_teams) if selected_teams else 0)
-    
-    valid_count = 0
-    
-    # Generate combinations
-    driver_combinations = itertools.combinations(drivers_df.itertuples(index=False), remaining_drivers)
-    team_combinations = list(itertools.combinations(teams_df.itertuples(index=False), remaining_teams))
-    
-    # Count valid combinations
-    for driver_combo in driver_combinations:
-        driver_cost = sum(driver.cost for driver in driver_combo)
-        if driver_cost > remaining_budget:
-            continue
-            
-        for team_combo in team_combinations:
-            total_cost = driver_cost + sum(team.cost for team in team_combo)
-            if total_cost <= remaining_budget:
-                valid_count += 1
-    
-    return valid_count
+# Selections recur constantly, across sessions too, so fused results are shared
+# process-wide and keyed by the canonical (sorted) selection, budget and data version.
+# Clicking on to another selection cancels this session's previous job
+def evaluate_current_selection(max_cost=100):
+    selected_drivers = tuple(sorted(st.session_state.selected_drivers))
+    selected_teams = tuple(sorted(st.session_state.selected_teams))
+    index, registry = load_lineup_index(), load_data()
+    return load_job_pool().submit(
+        st.session_state.session_id,
+        (selected_drivers, selected_teams, max_cost, load_dataset_version()),
+        lambda: iter_selection(index, registry, selected_drivers, selected_teams, max_cost),
+    )
+
+# The frontier comes from one DP pass and is shared the same way
+@st.cache_resource(max_entries=256)
+def cached_frontier(selected_drivers, selected_teams, max_cost, dataset_version):
+    return pareto_frontier(load_data(), selected_drivers, selected_teams, max_cost)
+
+def current_frontier(max_cost=100):
+    return cached_frontier(
+        tuple(sorted(st.session_state.selected_drivers)),
+        tuple(sorted(st.session_state.selected_teams)),
+        max_cost,
+        load_dataset_version(),
+    )
 
-def estimate_rank(points, min_points=25, max_points=1749, total_combinations=297307):
-    """
-    Estimate the rank of a combination based on its points.
-    """
-    # Linear mapping from points to rank (higher points = lower rank number)
-    points_range = max_points - min_points
-    rank = int((max_points - points) / points_range * total_combinations) + 1
-    return rank
+def describe_lineup(lineup, registry):
+    drivers, teams = member_names(lineup, registry)
+    return f"{', '.join(drivers[:-1])}, and {drivers[-1]} + {' and '.join(teams)}"
+
+def show_combination(title, combo, selected_drivers, selected_teams, total_points, total_cost, lineup_ranks):
+    drivers, teams, points, cost = combo
+
+    # Create lists of all drivers and teams (current + recommended)
+    all_drivers = st.session_state.selected_drivers + [d.name for d in drivers]
+    all_teams = st.session_state.selected_teams + [t.name for t in teams]
+
+    # Format driver and team strings with bold for selected ones
+    driver_labels = [f"**{d}**" if d in st.session_state.selected_drivers else d for d in all_drivers]
+    team_labels = [f"**{t}**" if t in st.session_state.selected_teams else t for t in all_teams]
+
+    # Calculate value ratio for the combination
+    total_combo_cost = total_cost + cost
+    value_ratio = points / total_combo_cost if total_combo_cost > 0 else 0
+
+    expander_label = (
+        f"{title} (#{lineup_ranks.rank(points):,}/{len(lineup_ranks):,}, "
+        f"{lineup_ranks.percentile(points):.1f} pctl) | Points: {int(points)} | "
+        f"Cost: {total_combo_cost:.1f}M | Value: {value_ratio:.2f}\n\n"
+        f"Drivers: {', '.join(driver_labels)}\n\n"
+        f"Teams: {', '.join(team_labels)}"
+    )
+
+    with st.expander(expander_label):
+        # Calculate total points for this combination (including current selections)
+        combo_total_points = total_points
+        # Add points from recommended additions
+        combo_total_points += sum(driver.points for driver in drivers)
+        combo_total_points += sum(team.points for team in teams)
+
+        st.write("Current Selections:")
+        if st.session_state.selected_drivers:
+            st.write("&nbsp;&nbsp;&nbsp;&nbsp;Drivers:")
+            for driver in selected_drivers:
+                d_points = driver.points
+                d_cost = driver.cost
+                value_ratio = d_points / d_cost
+                contribution = (d_points / combo_total_points * 100) if combo_total_points > 0 else 0
+                st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{driver.name} (Points: {int(d_points)}, Cost: {d_cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
+        if st.session_state.selected_teams:
+            st.write("&nbsp;&nbsp;&nbsp;&nbsp;Teams:")
+            for team in selected_teams:
+                t_points = team.points
+                t_cost = team.cost
+                value_ratio = t_points / t_cost
+                contribution = (t_points / combo_total_points * 100) if combo_total_points > 0 else 0
+                st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{team.name} (Points: {int(t_points)}, Cost: {t_cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
+
+        st.write("\nRecommended Additions:")
+        if drivers:
+            st.write("&nbsp;&nbsp;&nbsp;&nbsp;Drivers:")
+            for driver in drivers:
+                value_ratio = driver.points / driver.cost
+                contribution = (driver.points / combo_total_points * 100) if combo_total_points > 0 else 0
+                st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{driver.name} (Points: {int(driver.points)}, Cost: {driver.cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
+        if teams:
+            st.write("&nbsp;&nbsp;&nbsp;&nbsp;Teams:")
+            for team in teams:
+                value_ratio = team.points / team.cost
+                contribution = (team.points / combo_total_points * 100) if combo_total_points > 0 else 0
+                st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{team.name} (Points: {int(team.points)}, Cost: {team.cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
 
 def main():
     st.title("Formulab")
     st.header("F1 Fantasy Team Builder")
-    st.markdown("""
-    There are 697,680 possible combinations of 5 drivers and 2 teams. Of those, 297,307 respect F1 Fantasy's 100M cost cap. With such a large solution space, finding a satisfactory combination can be a challenge. This tool is intended to provide some assistance with that.
+    with instrumentation.phase('load_data'):
+        registry = load_data()
+        lineup_index = load_lineup_index()
+        lineup_ranks = load_lineup_ranks()
+        highest, lowest = extreme_lineups(lineup_index)
+    total_lineups = math.comb(len(registry.drivers), 5) * math.comb(len(registry.teams), 2)
     
-    The following is entirely based on 2024 season points for drivers and teams. Past performance is of course not necessarily indicative of future results, so take everything with a grain of salt. For reference:
-    - The \"most optimal\" combination, with 1749 points, is Sainz, Alonso, Ocon, Bearman, and Hulkenberg + Mclaren and Ferrari.
-    - The \"least optimal\" combination, with 25 points, is Antonelli, Lawson, Doohan, Hadjar, and Bortoleto + Williams and Kick Sauber.
-    """)
+    st.markdown(f"""
+    There are {total_lineups:,} possible combinations of 5 drivers and 2 teams. Of those, {len(lineup_ranks):,} respect F1 Fantasy's 100M cost cap. With such a large solution space, finding a satisfactory combination can be a challenge. This tool is intended to provide some assistance with that.
     
-    drivers_df, teams_df = load_data()
+    The following is entirely based on {load_points_basis()} for drivers and teams. Past performance is of course not necessarily indicative of future results, so take everything with a grain of salt. For reference:
+    - The \"most optimal\" combination, with {int(highest['points'])} points, is {describe_lineup(highest, registry)}.
+    - The \"least optimal\" combination, with {int(lowest['points'])} points, is {describe_lineup(lowest, registry)}.
+    """)
     
     # Initialize session state for selections
     if 'selected_drivers' not in st.session_state:
         st.session_state.selected_drivers = []
     if 'selected_teams' not in st.session_state:
         st.session_state.selected_teams = []
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Select Drivers (5)")
-        available_drivers = [d for d in drivers_df['driver'].tolist() 
+        available_drivers = [d for d in registry.drivers.names 
                            if d not in st.session_state.selected_drivers]
         
         if len(st.session_state.selected_drivers) < 5:
@@ -159,7 +186,7 @@ def main():
     
     with col2:
         st.subheader("Select Teams (2)")
-        available_teams = [t for t in teams_df['team'].tolist() 
+        available_teams = [t for t in registry.teams.names 
                          if t not in st.session_state.selected_teams]
         
         if len(st.session_state.selected_teams) < 2:
@@ -174,16 +201,13 @@ def main():
     st.subheader("Current Selections")
     col3, spacer, col4 = st.columns([1, 0.1, 1])
     
-    # Calculate total points and cost for contribution percentages
-    total_points = (
-        drivers_df[drivers_df['driver'].isin(st.session_state.selected_drivers)]['points_2024'].sum() +
-        teams_df[teams_df['team'].isin(st.session_state.selected_teams)]['points_2024'].sum()
-    )
+    # Look up the selected entities once for the cards and the expanders
+    selected_drivers = [registry.drivers.get(driver) for driver in st.session_state.selected_drivers]
+    selected_teams = [registry.teams.get(team) for team in st.session_state.selected_teams]
     
-    total_cost = (
-        drivers_df[drivers_df['driver'].isin(st.session_state.selected_drivers)]['cost'].sum() +
-        teams_df[teams_df['team'].isin(st.session_state.selected_teams)]['cost'].sum()
-    )
+    # Calculate total points and cost for contribution percentages
+    total_points = sum(entity.points for entity in selected_drivers + selected_teams)
+    total_cost = sum(entity.cost for entity in selected_drivers + selected_teams)
     
     # Calculate total value ratio
     value_ratio = total_points / total_cost if total_cost > 0 else 0
@@ -198,10 +222,9 @@ def main():
     
     with col3:
         st.write("Selected Drivers:")
-        for driver in st.session_state.selected_drivers:
-            driver_info = drivers_df[drivers_df['driver'] == driver].iloc[0]
-            points = driver_info['points_2024']
-            cost = driver_info['cost']
+        for driver in selected_drivers:
+            points = driver.points
+            cost = driver.cost
             value_ratio = points / cost
             contribution = (points / total_points * 100) if total_points > 0 else 0
             
@@ -211,23 +234,22 @@ def main():
             
             with col1:
                 st.markdown(
-                    f"**{driver}**  \n"
+                    f"**{driver.name}**  \n"
                     f"Points: {int(points)}  \n"
                     f"Cost: {cost:.1f}M  \n"
                     f"Value: {value_ratio:.2f}  \n"
                     f"Contribution: {contribution:.1f}%"
                 )
             with col2:
-                if st.button("❌", key=f"remove_driver_{driver}"):
-                    st.session_state.selected_drivers.remove(driver)
+                if st.button("❌", key=f"remove_driver_{driver.name}"):
+                    st.session_state.selected_drivers.remove(driver.name)
                     st.rerun()
     
     with col4:
         st.write("Selected Teams:")
-        for team in st.session_state.selected_teams:
-            team_info = teams_df[teams_df['team'] == team].iloc[0]
-            points = team_info['points_2024']
-            cost = team_info['cost']
+        for team in selected_teams:
+            points = team.points
+            cost = team.cost
             value_ratio = points / cost
             contribution = (points / total_points * 100) if total_points > 0 else 0
             
@@ -237,111 +259,131 @@ def main():
             
             with col1:
                 st.markdown(
-                    f"**{team}**  \n"
+                    f"**{team.name}**  \n"
                     f"Points: {int(points)}  \n"
                     f"Cost: {cost:.1f}M  \n"
                     f"Value: {value_ratio:.2f}  \n"
                     f"Contribution: {contribution:.1f}%"
                 )
             with col2:
-                if st.button("❌", key=f"remove_team_{team}"):
-                    st.session_state.selected_teams.remove(team)
+                if st.button("❌", key=f"remove_team_{team.name}"):
+                    st.session_state.selected_teams.remove(team.name)
                     st.rerun()
     
-    # Display total valid combinations with current selections
+    # Count, best lineups and points range all come from one cached pass
     if st.session_state.selected_drivers or st.session_state.selected_teams:
-        with st.spinner('Calculating valid combinations...'):
-            valid_combos = count_valid_combinations(
-                drivers_df,
-                teams_df,
-                st.session_state.selected_drivers,
-                st.session_state.selected_teams
+        with instrumentation.phase('evaluate_selection'):
+            job = evaluate_current_selection()
+            instrumentation.count(selection_cached=int(job.done()))
+            
+            # Show partial results every 0.1s until the job finishes, returning as soon
+            # as it does; a click meanwhile reruns the script, which ends this loop and
+            # hands the job to the new selection
+            progress = st.empty()
+            while not job.wait(0.1):
+                partial = job.partial
+                with progress.container():
+                    if partial is None:
+                        st.info("Evaluating current selections...")
+                    else:
+                        st.info(f"Found {partial.count:,} valid combinations so far...")
+                        if partial.combinations:
+                            drivers, teams, points, cost = partial.combinations[0]
+                            best_drivers = st.session_state.selected_drivers + [d.name for d in drivers]
+                            best_teams = st.session_state.selected_teams + [t.name for t in teams]
+                            st.write(
+                                f"Best so far: {int(points)} points, {total_cost + cost:.1f}M | "
+                                f"{', '.join(best_drivers)} + {' and '.join(best_teams)}"
+                            )
+            progress.empty()
+            selection = job.result()
+            # The job runs outside this rerun's trace, so its counts come with the result
+            instrumentation.count(
+                selection_scanned=selection.scanned,
+                selection_matches=selection.count,
+                selection_rejected=selection.scanned - selection.count,
             )
-            st.info(f"There are {valid_combos:,} valid combinations possible with your current selections.")
-
-    # Find and display optimal combinations
-    if st.session_state.selected_drivers or st.session_state.selected_teams:
-        st.subheader("Optimal Combinations with Current Selections")
         
-        with st.spinner('Calculating optimal combinations...'):
-            best_combos = find_best_combinations(
-                drivers_df, 
-                teams_df,
-                st.session_state.selected_drivers,
-                st.session_state.selected_teams,
-                top_n=5
+        if selection.count:
+            st.info(
+                f"There are {selection.count:,} valid combinations possible with your current selections, "
+                f"scoring between {int(selection.min_points)} and {int(selection.max_points)} points."
             )
+        else:
+            st.info("There are 0 valid combinations possible with your current selections.")
+        
+        st.subheader("Optimal Combinations with Current Selections")
+        best_combos = selection.combinations
         
         if not best_combos:
             st.warning("No valid combinations found with the current selections and budget constraints.")
         else:
-            for i, (drivers, teams, points, cost) in enumerate(best_combos, 1):
-                # Create lists of all drivers and teams (current + recommended)
-                all_drivers = st.session_state.selected_drivers + [d.driver for d in drivers]
-                all_teams = st.session_state.selected_teams + [t.team for t in teams]
-                
-                # Format driver and team strings with bold for selected ones
-                driver_labels = [f"**{d}**" if d in st.session_state.selected_drivers else d for d in all_drivers]
-                team_labels = [f"**{t}**" if t in st.session_state.selected_teams else t for t in all_teams]
-                
-                # Calculate value ratio for the combination
-                total_combo_cost = total_cost + cost
-                value_ratio = points / total_combo_cost if total_combo_cost > 0 else 0
-                
-                expander_label = (
-                    f"Combination {i} (~{estimate_rank(points):,}/297,307) | Points: {int(points)} | "
-                    f"Cost: {total_combo_cost:.1f}M | Value: {value_ratio:.2f}\n\n"
-                    f"Drivers: {', '.join(driver_labels)}\n\n"
-                    f"Teams: {', '.join(team_labels)}"
+            with instrumentation.phase('render_combinations'):
+                for i, combo in enumerate(best_combos, 1):
+                    show_combination(
+                        f"Combination {i}", combo, selected_drivers, selected_teams,
+                        total_points, total_cost, lineup_ranks,
+                    )
+                instrumentation.count(combinations_rendered=len(best_combos))
+        
+        st.subheader("Points vs. Cost Frontier")
+        with instrumentation.phase('frontier'):
+            frontier = current_frontier()
+        if frontier:
+            st.caption("Each point is the best lineup for its cost; cheaper lineups all score less. Click a point to see it.")
+            with instrumentation.phase('render_frontier'):
+                chart_data = pd.DataFrame({
+                    'lineup': range(len(frontier)),
+                    'cost': [total_cost + point.cost for point in frontier],
+                    'points': [point.points for point in frontier],
+                })
+                lineup_pick = alt.selection_point(name='lineup', fields=['lineup'])
+                chart = (
+                    alt.Chart(chart_data)
+                    .mark_line(point=True)
+                    .encode(
+                        x=alt.X('cost', title='Cost (M)', scale=alt.Scale(zero=False)),
+                        y=alt.Y('points', title='Points', scale=alt.Scale(zero=False)),
+                        tooltip=['cost', 'points'],
+                    )
+                    .add_params(lineup_pick)
                 )
-                
-                with st.expander(expander_label):
-                    # Calculate total points for this combination (including current selections)
-                    combo_total_points = 0
-                    # Add points from current selections
-                    for driver in st.session_state.selected_drivers:
-                        driver_info = drivers_df[drivers_df['driver'] == driver].iloc[0]
-                        combo_total_points += driver_info['points_2024']
-                    for team in st.session_state.selected_teams:
-                        team_info = teams_df[teams_df['team'] == team].iloc[0]
-                        combo_total_points += team_info['points_2024']
-                    # Add points from recommended additions
-                    combo_total_points += sum(driver.points for driver in drivers)
-                    combo_total_points += sum(team.points for team in teams)
-                    
-                    st.write("Current Selections:")
-                    if st.session_state.selected_drivers:
-                        st.write("&nbsp;&nbsp;&nbsp;&nbsp;Drivers:")
-                        for driver in st.session_state.selected_drivers:
-                            driver_info = drivers_df[drivers_df['driver'] == driver].iloc[0]
-                            d_points = driver_info['points_2024']
-                            d_cost = driver_info['cost']
-                            value_ratio = d_points / d_cost
-                            contribution = (d_points / combo_total_points * 100) if combo_total_points > 0 else 0
-                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{driver} (Points: {int(d_points)}, Cost: {d_cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
-                    if st.session_state.selected_teams:
-                        st.write("&nbsp;&nbsp;&nbsp;&nbsp;Teams:")
-                        for team in st.session_state.selected_teams:
-                            team_info = teams_df[teams_df['team'] == team].iloc[0]
-                            t_points = team_info['points_2024']
-                            t_cost = team_info['cost']
-                            value_ratio = t_points / t_cost
-                            contribution = (t_points / combo_total_points * 100) if combo_total_points > 0 else 0
-                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{team} (Points: {int(t_points)}, Cost: {t_cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
-                    
-                    st.write("\nRecommended Additions:")
-                    if drivers:
-                        st.write("&nbsp;&nbsp;&nbsp;&nbsp;Drivers:")
-                        for driver in drivers:
-                            value_ratio = driver.points / driver.cost
-                            contribution = (driver.points / combo_total_points * 100) if combo_total_points > 0 else 0
-                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{driver.driver} (Points: {int(driver.points)}, Cost: {driver.cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
-                    if teams:
-                        st.write("&nbsp;&nbsp;&nbsp;&nbsp;Teams:")
-                        for team in teams:
-                            value_ratio = team.points / team.cost
-                            contribution = (team.points / combo_total_points * 100) if combo_total_points > 0 else 0
-                            st.markdown(f"&nbsp;&nbsp;&nbsp;&nbsp;•&nbsp;&nbsp;&nbsp;&nbsp;{team.team} (Points: {int(team.points)}, Cost: {team.cost:.1f}M, Value: {value_ratio:.2f}, Contribution: {contribution:.1f}%)")
+                # Streamlit keeps a keyed chart's selection across reruns, so the key names
+                # the frontier it was made on; a click never carries over to another one
+                frontier_key = "frontier_chart:" + "|".join([
+                    *sorted(st.session_state.selected_drivers), *sorted(st.session_state.selected_teams),
+                    load_dataset_version(),
+                ])
+                event = st.altair_chart(chart, on_select="rerun", key=frontier_key)
+                for picked in event.selection.get('lineup', []):
+                    if not 0 <= picked['lineup'] < len(frontier):
+                        continue
+                    point = frontier[picked['lineup']]
+                    show_combination(
+                        f"Frontier lineup at {total_cost + point.cost:.1f}M", point, selected_drivers, selected_teams,
+                        total_points, total_cost, lineup_ranks,
+                    )
+
+def show_debug_panel(trace):
+    with st.sidebar:
+        st.subheader("Debug timings")
+        st.caption(f"Rerun took {trace.seconds * 1000:.1f}ms")
+        phases = pd.DataFrame(trace.phases, columns=['phase', 'seconds', 'peak_mb'])
+        st.dataframe(phases.assign(ms=phases.pop('seconds') * 1000), hide_index=True)
+        if trace.counters:
+            st.dataframe(pd.Series(trace.counters, name='count'))
+
+# Add ?debug=1 to the URL for a timing panel on each rerun; FORMULAB_TRACE=1 traces
+# every session. Either way each rerun is also logged to stderr as a JSON line
+def run():
+    debug = st.query_params.get('debug') == '1'
+    enabled = debug or bool(os.environ.get('FORMULAB_TRACE'))
+    if enabled:
+        instrumentation.log_to_stderr()
+    with instrumentation.tracing('rerun', enabled, track_memory=debug) as trace:
+        main()
+    if debug:
+        show_debug_panel(trace)
 
 if __name__ == "__main__":
-    main()
+    run()
@@ -0,0 +1,171 @@
+import argparse
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from compute_stats import find_all_valid_combinations
+from lineups import (
+    BRANCH_AND_BOUND_MAX_N,
+    DRIVER_SLOTS,
+    TEAM_SLOTS,
+    count_valid_combinations,
+    find_best_combinations,
+)
+from registry import EntityPool, Registry
+
+REPORT_PATH = 'benchmark-report.json'
+DEFAULT_SIZES = ((20, 10), (25, 12), (30, 15), (40, 20))
+DEFAULT_BUDGETS = (100, 80)
+
+# Largest grid of lineups cross-checked with the full-scan solver
+GRID_CHECK_MAX = 20_000_000
+
+
+def synthetic_registry(n_drivers, n_teams, seed=0):
+    """A random pool shaped like the real data: points and costs in the same ranges, two drivers per team."""
+    rng = np.random.default_rng(seed)
+    team_names = [f'Team {j + 1}' for j in range(n_teams)]
+    drivers = EntityPool(
+        [f'Driver {i + 1}' for i in range(n_drivers)],
+        rng.integers(0, 450, n_drivers),
+        rng.integers(45, 300, n_drivers) / 10,
+        teams=[team_names[i // 2 % n_teams] for i in range(n_drivers)],
+    )
+    teams = EntityPool(team_names, rng.integers(0, 700, n_teams), rng.integers(60, 300, n_teams) / 10)
+    return Registry(drivers, teams)
+
+
+def selections(registry):
+    """Pre-selections to benchmark: none, one top driver, and two drivers plus a team."""
+    by_points = [registry.drivers.names[i] for i in np.argsort(-registry.drivers.points, kind='stable')]
+    return [
+        ([], []),
+        (by_points[:1], []),
+        (by_points[1:3], [registry.teams.names[0]]),
+    ]
+
+
+def measure(function, *args, repeat=1):
+    """Run a call `repeat` times; returns its result, best wall time and peak traced memory in MiB.
+
+    Times come from untraced runs, since tracemalloc slows each solver by a
+    different factor; the peak comes from one extra traced run.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak / 2**20
+
+
+def run_case(registry, budget, selected_drivers, selected_teams, repeat=1, workers=1):
+    """Benchmark the solvers on one pool, budget and selection, and cross-check their results."""
+    seconds = {}
+    peak_mb = {}
+    checks = {}
+
+    def timed(function, *args):
+        result, seconds[function.__name__], peak_mb[function.__name__] = measure(function, *args, repeat=repeat)
+        return result
+
+    best = timed(find_best_combinations, registry, selected_drivers, selected_teams, budget)
+    count = timed(count_valid_combinations, registry, selected_drivers, selected_teams, budget)
+
+    # The full-scan solver behind large top_n must agree with branch and bound
+    grid_size = (
+        math.comb(len(registry.drivers) - len(selected_drivers), DRIVER_SLOTS - len(selected_drivers))
+        * math.comb(len(registry.teams) - len(selected_teams), TEAM_SLOTS - len(selected_teams))
+    )
+    if grid_size <= GRID_CHECK_MAX:
+        grid_best = find_best_combinations(
+            registry, selected_drivers, selected_teams, budget, top_n=BRANCH_AND_BOUND_MAX_N + 1
+        )
+        checks['grid_matches_branch_and_bound'] = grid_best[:len(best)] == best
+        checks['grid_count_bound'] = len(grid_best) == min(count, BRANCH_AND_BOUND_MAX_N + 1)
+
+    # The sharded scan has no selections, so it only checks the unselected case
+    if not selected_drivers and not selected_teams:
+        stats = timed(find_all_valid_combinations, registry, budget, workers)
+        checks['scan_count_matches'] = stats.count == count
+        if best:
+            checks['scan_best_matches'] = stats.max_combo[:2] == best[0][:2]
+            checks['histogram_total_matches'] = sum(stats.histogram.values()) == count
+
+    return {
+        'drivers': len(registry.drivers),
+        'teams': len(registry.teams),
+        'budget': budget,
+        'selected_drivers': list(selected_drivers),
+        'selected_teams': list(selected_teams),
+        'lineups': grid_size,
+        'valid_lineups': count,
+        'best_points': best[0][2] if best else None,
+        'seconds': seconds,
+        'peak_mb': peak_mb,
+        'checks': checks,
+    }
+
+
+def parse_sizes(value):
+    return [tuple(int(part) for part in size.split('x')) for size in value.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lineup solvers on synthetic pools of increasing size.")
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help="comma-separated DRIVERSxTEAMS pool sizes, e.g. 20x10,40x20")
+    parser.add_argument('--budgets', type=float, nargs='+', default=DEFAULT_BUDGETS, help="cost caps in millions")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per call; the best time is reported")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes for the full scan")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic pools")
+    parser.add_argument('--output', default=REPORT_PATH, help="JSON report path")
+    args = parser.parse_args()
+
+    cases = []
+    for n_drivers, n_teams in args.sizes:
+        registry = synthetic_registry(n_drivers, n_teams, args.seed)
+        for budget in args.budgets:
+            for selected_drivers, selected_teams in selections(registry):
+                case = run_case(registry, budget, selected_drivers, selected_teams, args.repeat, args.workers)
+                cases.append(case)
+                failed = [name for name, passed in case['checks'].items() if not passed]
+                print(
+                    f"{n_drivers}x{n_teams} @ {budget:g}M, {len(selected_drivers)}+{len(selected_teams)} selected: "
+                    f"{case['valid_lineups']:,} valid | "
+                    + ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in case['seconds'].items())
+                    + (f" | FAILED {', '.join(failed)}" if failed else "")
+                )
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'workers': args.workers,
+        'cases': cases,
+        'passed': all(all(case['checks'].values()) for case in cases),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote report to {args.output}")
+    if not report['passed']:
+        raise SystemExit("Some solver results disagree; see the report's checks.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,137 @@
-import pandas as pd
+import argparse
 import itertools
+import math
+import os
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def load_data():
-    drivers_df = pd.read_csv('data/f1_fantasy_drivers.csv')
-    teams_df = pd.read_csv('data/f1_fantasy_teams.csv')
-    
-    drivers_df['driver'] = drivers_df['driver'].str.replace('_', ' ').str.title()
-    teams_df['team'] = teams_df['team'].str.replace('_', ' ').str.title()
-    
-    return drivers_df, teams_df
-
-def find_all_valid_combinations(drivers_df, teams_df, max_cost=100):
-    # Create copies and rename columns
-    drivers_df = drivers_df.copy()
-    teams_df = teams_df.copy()
-    drivers_df = drivers_df.rename(columns={'points_2024': 'points'})
-    teams_df = teams_df.rename(columns={'points_2024': 'points'})
-    
-    # Generate all possible combinations
-    driver_combinations = list(itertools.combinations(drivers_df.itertuples(index=False), 5))
-    team_combinations = list(itertools.combinations(teams_df.itertuples(index=False), 2))
-    
-    valid_combinations = []
-    min_points = float('inf')
-    max_points = 0
-    min_combo = None
-    max_combo = None
-    
-    print("Processing combinations...")
-    total_combos = len(driver_combinations) * len(team_combinations)
-    processed = 0
-    
-    for driver_combo in driver_combinations:
-        for team_combo in team_combinations:
-            processed += 1
-            if processed % 100000 == 0:
-                print(f"Processed {processed:,} of {total_combos:,} combinations")
-                
-            total_cost = sum(driver.cost for driver in driver_combo) + sum(team.cost for team in team_combo)
-            
-            if total_cost <= max_cost:
-                total_points = (
-                    sum(driver.points for driver in driver_combo) +
-                    sum(team.points for team in team_combo)
-                )
-                
-                valid_combinations.append((driver_combo, team_combo, total_points, total_cost))
-                
-                if total_points < min_points:
-                    min_points = total_points
-                    min_combo = (driver_combo, team_combo, total_cost)
-                
-                if total_points > max_points:
-                    max_points = total_points
-                    max_combo = (driver_combo, team_combo, total_cost)
-    
-    return len(valid_combinations), min_combo, max_combo
+import numpy as np
+
+import instrumentation
+from lineup_index import INDEX_PATH, build_index, write_index
+from lineups import DRIVER_SLOTS, TEAM_SLOTS, combination_indices, to_tenths
+from loaders import DATA_FILES, load_registry
+from races import DEFAULT_WINDOW, parse_window
+
+# Shards are all the driver subsets sharing their first SHARD_PREFIX drivers
+SHARD_PREFIX = 2
+HISTOGRAM_BIN_WIDTH = 10
+
+ShardStats = namedtuple('ShardStats', ['size', 'count', 'lowest', 'highest', 'histogram'])
+ScanProgress = namedtuple('ScanProgress', ['shards_done', 'shards_total', 'scanned', 'total', 'valid'])
+ScanStats = namedtuple('ScanStats', ['count', 'min_combo', 'max_combo', 'histogram', 'bin_width'])
+
+# Pool arrays, set once per worker process so shards only ship their prefix
+_shard_state = {}
+
+def _init_shard_state(driver_points, driver_costs, team_combos, team_points, team_costs, budget):
+    _shard_state.update(
+        driver_points=driver_points,
+        driver_costs=driver_costs,
+        team_combos=team_combos,
+        team_points=team_points,
+        team_costs=team_costs,
+        budget=budget,
+    )
+
+def scan_shard(prefix):
+    """Aggregate every lineup whose driver subset starts with `prefix`.
+
+    Extremes are (points, driver positions, team positions, cost) with ties
+    going to the lineup that comes first in itertools order.
+    """
+    state = _shard_state
+    n = len(state['driver_points'])
+    tail_start = prefix[-1] + 1
+    tail = combination_indices(n - tail_start, DRIVER_SLOTS - len(prefix)) + tail_start
+
+    prefix = list(prefix)
+    combo_cost = state['driver_costs'][prefix].sum() + state['driver_costs'][tail].sum(axis=1)
+    combo_points = state['driver_points'][prefix].sum() + state['driver_points'][tail].sum(axis=1)
+    total_cost = combo_cost[:, None] + state['team_costs'][None, :]
+    total_points = combo_points[:, None] + state['team_points'][None, :]
+
+    valid = np.flatnonzero(total_cost <= state['budget'])
+    if len(valid) == 0:
+        return ShardStats(total_cost.size, 0, None, None, Counter())
+
+    points = total_points.ravel()[valid]
+
+    def extreme(flat):
+        d, t = divmod(int(flat), total_cost.shape[1])
+        drivers = tuple(prefix + tail[d].tolist())
+        teams = tuple(state['team_combos'][t].tolist())
+        return total_points[d, t].item(), drivers, teams, total_cost[d, t].item()
+
+    # Histogram keys are the lower edge of each points bin
+    bins, counts = np.unique(points // HISTOGRAM_BIN_WIDTH * HISTOGRAM_BIN_WIDTH, return_counts=True)
+    histogram = Counter(dict(zip(bins.tolist(), counts.tolist())))
+
+    # argmin/argmax return the first occurrence, which is the earliest in enumeration order
+    return ShardStats(total_cost.size, len(valid), extreme(valid[np.argmin(points)]), extreme(valid[np.argmax(points)]), histogram)
+
+@instrumentation.timed
+def find_all_valid_combinations(registry, max_cost=100, workers=None, progress=None):
+    """Scan every lineup within max_cost, sharded across worker processes.
+
+    Workers stream back per-shard count, extremes and points histogram, so
+    memory stays flat however large the pools are. `progress`, if given, is
+    called with a ScanProgress after each shard.
+    """
+    drivers, teams = registry.drivers, registry.teams
+
+    team_combos = combination_indices(len(teams), TEAM_SLOTS)
+    shard_state = (
+        drivers.points,
+        drivers.cost_tenths,
+        team_combos,
+        teams.points[team_combos].sum(axis=1),
+        teams.cost_tenths[team_combos].sum(axis=1),
+        int(to_tenths(max_cost)),
+    )
+
+    prefixes = list(itertools.combinations(range(len(drivers)), SHARD_PREFIX))
+    total = math.comb(len(drivers), DRIVER_SLOTS) * len(team_combos)
+
+    count = 0
+    scanned = 0
+    lowest = None
+    highest = None
+    histogram = Counter()
+
+    def reduce(shard, shards_done):
+        nonlocal count, scanned, lowest, highest
+        count += shard.count
+        scanned += shard.size
+        if shard.count:
+            # Shards finish out of order, so break ties on enumeration position
+            if lowest is None or (shard.lowest[0], shard.lowest[1:3]) < (lowest[0], lowest[1:3]):
+                lowest = shard.lowest
+            if highest is None or (-shard.highest[0], shard.highest[1:3]) < (-highest[0], highest[1:3]):
+                highest = shard.highest
+            histogram.update(shard.histogram)
+        if progress:
+            progress(ScanProgress(shards_done, len(prefixes), scanned, total, count))
+
+    if workers == 1:
+        _init_shard_state(*shard_state)
+        for shards_done, prefix in enumerate(prefixes, 1):
+            reduce(scan_shard(prefix), shards_done)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_state, initargs=shard_state) as executor:
+            futures = [executor.submit(scan_shard, prefix) for prefix in prefixes]
+            for shards_done, future in enumerate(as_completed(futures), 1):
+                reduce(future.result(), shards_done)
+
+    instrumentation.count(scan_lineups=scanned, scan_valid=count)
+
+    def combo(extreme):
+        if extreme is None:
+            return None
+        _, driver_ids, team_ids, cost = extreme
+        return tuple(drivers[i] for i in driver_ids), tuple(teams[j] for j in team_ids), cost / 10
+
+    return ScanStats(count, combo(lowest), combo(highest), dict(sorted(histogram.items())), HISTOGRAM_BIN_WIDTH)
 
 def print_combo_details(combo, combo_type):
     drivers, teams, cost = combo
@@ -63,27 +139,59 @@ def print_combo_details(combo, combo_type):
         sum(driver.points for driver in drivers) +
         sum(team.points for team in teams)
     )
-    
+
     print(f"\n{combo_type} Points Combination:")
     print(f"Total Points: {total_points:.1f}")
     print(f"Total Cost: {cost:.1f}M")
     print("\nDrivers:")
     for driver in drivers:
-        print(f"- {driver.driver}: {driver.points:.1f} points, {driver.cost:.1f}M")
+        print(f"- {driver.name}: {driver.points:.1f} points, {driver.cost:.1f}M")
     print("\nTeams:")
     for team in teams:
-        print(f"- {team.team}: {team.points:.1f} points, {team.cost:.1f}M")
+        print(f"- {team.name}: {team.points:.1f} points, {team.cost:.1f}M")
 
 def main():
-    drivers_df, teams_df = load_data()
-    
+    parser = argparse.ArgumentParser(description="Compute statistics over every valid F1 Fantasy lineup.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes (1 scans in-process)")
+    parser.add_argument('--budget', type=float, default=100, help="cost cap in millions")
+    parser.add_argument('--drivers', default=DATA_FILES[0], help="drivers CSV")
+    parser.add_argument('--teams', default=DATA_FILES[1], help="teams CSV")
+    parser.add_argument('--window', default=DEFAULT_WINDOW,
+                        help="score on stored race results: season, last:N, blend:D or baseline")
+    parser.add_argument('--index', help=(
+        f"also write the lineup index here; defaults to the app's {INDEX_PATH} when scanning its pool at its 100M "
+        "cap. Unlike the scan, building the index holds the whole lineup grid in memory"
+    ))
+    parser.add_argument('--no-index', action='store_true', help="don't write a lineup index")
+    args = parser.parse_args()
+
+    registry = load_registry(args.drivers, args.teams, parse_window(args.window))
+
+    reported = 0
+
+    def print_progress(update):
+        nonlocal reported
+        percent = update.scanned * 100 // update.total
+        if percent >= reported + 10 or update.shards_done == update.shards_total:
+            reported = percent
+            print(f"Processed {update.scanned:,} of {update.total:,} combinations ({update.valid:,} valid)")
+
     print("Calculating all valid combinations...")
-    total_valid, min_combo, max_combo = find_all_valid_combinations(drivers_df, teams_df)
-    
-    print(f"\nTotal number of valid combinations: {total_valid:,}")
-    
-    print_combo_details(min_combo, "Lowest")
-    print_combo_details(max_combo, "Highest")
+    stats = find_all_valid_combinations(registry, args.budget, args.workers, print_progress)
+
+    print(f"\nTotal number of valid combinations: {stats.count:,}")
+
+    if stats.count:
+        print_combo_details(stats.min_combo, "Lowest")
+        print_combo_details(stats.max_combo, "Highest")
+
+    # Only the app's own pool and cap belong in its index file
+    index_path = args.index
+    if index_path is None and (args.drivers, args.teams) == DATA_FILES and args.budget == 100:
+        index_path = INDEX_PATH
+    if index_path and not args.no_index:
+        write_index(build_index(registry, args.budget), registry.digest(), args.budget, index_path)
+        print(f"\nWrote lineup index to {index_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
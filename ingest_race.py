@@ -0,0 +1,66 @@
+import argparse
+import time
+
+import pandas as pd
+
+from lineup_index import (
+    INDEX_PATH,
+    LineupRanks,
+    build_index,
+    extreme_lineups,
+    member_names,
+    open_index,
+    update_index,
+    write_index,
+)
+from loaders import DATA_FILES, load_registry
+from races import DEFAULT_WINDOW, RACES_PATH, append_results, parse_window
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record race results and update the lineup index incrementally.")
+    parser.add_argument('results', help="CSV of season, race, name, points and, where the price changed, cost")
+    parser.add_argument('--window', default=DEFAULT_WINDOW,
+                        help="scoring window of the index, as FORMULAB_WINDOW for the app: season, last:N or blend:D")
+    parser.add_argument('--budget', type=float, default=100, help="cost cap in millions")
+    parser.add_argument('--races', default=RACES_PATH, help="race results store to append to")
+    parser.add_argument('--drivers', default=DATA_FILES[0], help="drivers CSV")
+    parser.add_argument('--teams', default=DATA_FILES[1], help="teams CSV")
+    parser.add_argument('--index', default=INDEX_PATH, help="lineup index to update")
+    args = parser.parse_args()
+
+    window = parse_window(args.window)
+    previous = load_registry(args.drivers, args.teams, window, args.races)
+    index = open_index(previous.digest(), args.budget, args.index)
+
+    results = pd.read_csv(args.results)
+    try:
+        append_results(results, args.races, previous)
+    except ValueError as error:
+        parser.error(str(error))
+    registry = load_registry(args.drivers, args.teams, window, args.races)
+    races = results[['season', 'race']].drop_duplicates()
+    print(f"Recorded {len(results)} results from {len(races)} race(s) in {args.races}")
+
+    start = time.perf_counter()
+    if index is None:
+        print("No index for the previous results, rebuilding it in full")
+        lineups = build_index(registry, args.budget)
+    else:
+        lineups = update_index(index, registry, previous, args.budget)
+    elapsed = time.perf_counter() - start
+    write_index(lineups, registry.digest(), args.budget, args.index)
+
+    ranks = LineupRanks(lineups)
+    print(f"Updated {args.index} in {elapsed:.2f}s: {len(ranks):,} valid lineups")
+    if len(lineups):
+        highest, lowest = extreme_lineups(lineups)
+        for label, lineup in (("Best", highest), ("Worst", lowest)):
+            drivers, teams = member_names(lineup, registry)
+            print(f"{label}: {lineup['points']:.1f} points, {lineup['cost'] / 10:.1f}M | {', '.join(drivers)} + {' and '.join(teams)}")
+        median = ranks.points[len(ranks) // 2]
+        print(f"Median lineup: {median:.1f} points")
+
+
+if __name__ == "__main__":
+    main()
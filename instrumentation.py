@@ -0,0 +1,128 @@
+import functools
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+logger = logging.getLogger('formulab.timings')
+
+# The trace of the run in progress on this thread, None when tracing is off
+_current = ContextVar('formulab_trace', default=None)
+_untraced = nullcontext()
+
+# tracemalloc is process-wide, so it runs while any trace tracks memory
+_memory_lock = threading.Lock()
+_memory_traces = 0
+
+
+class Trace:
+    """Wall time and peak allocations per phase, plus solver counters, for one run."""
+
+    def __init__(self, name, track_memory=False):
+        self.name = name
+        self.track_memory = track_memory
+        self.phases = []
+        self.counters = Counter()
+        self.seconds = None
+        # Peak bytes of each open phase from before its nested phases reset the peak
+        self.open_peaks = []
+
+    @contextmanager
+    def phase(self, name):
+        if self.track_memory:
+            if self.open_peaks:
+                self.open_peaks[-1] = max(self.open_peaks[-1], tracemalloc.get_traced_memory()[1])
+            self.open_peaks.append(0)
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak_mb = None
+            if self.track_memory:
+                # Peaks are process-wide, so concurrent sessions can inflate them
+                peak = max(tracemalloc.get_traced_memory()[1], self.open_peaks.pop())
+                if self.open_peaks:
+                    self.open_peaks[-1] = max(self.open_peaks[-1], peak)
+                peak_mb = peak / 2**20
+            self.phases.append({'phase': name, 'seconds': seconds, 'peak_mb': peak_mb})
+
+    def as_dict(self):
+        return {
+            'trace': self.name,
+            'seconds': self.seconds,
+            'phases': self.phases,
+            'counters': dict(self.counters),
+        }
+
+
+@contextmanager
+def tracing(name, enabled=True, track_memory=False):
+    """Trace the block and log it as one JSON line; yields the Trace, or None when disabled."""
+    global _memory_traces
+    if not enabled:
+        yield None
+        return
+
+    trace = Trace(name, track_memory)
+    token = _current.set(trace)
+    if track_memory:
+        with _memory_lock:
+            _memory_traces += 1
+            if _memory_traces == 1:
+                tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.seconds = time.perf_counter() - start
+        if track_memory:
+            with _memory_lock:
+                _memory_traces -= 1
+                if _memory_traces == 0:
+                    tracemalloc.stop()
+        _current.reset(token)
+        logger.info(json.dumps(trace.as_dict()))
+
+
+def phase(name):
+    """Time a phase of the current trace; a shared no-op when nothing is tracing."""
+    trace = _current.get()
+    if trace is None:
+        return _untraced
+    return trace.phase(name)
+
+
+def timed(function):
+    """Decorator timing each call as a phase named after the function."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        trace = _current.get()
+        if trace is None:
+            return function(*args, **kwargs)
+        with trace.phase(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def count(**counters):
+    """Add to counters of the current trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.counters.update(counters)
+
+
+def log_to_stderr():
+    """Send trace lines to stderr, one JSON object per line, without any other formatting."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
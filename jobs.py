@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+
+class Job:
+    """One keyed computation, shared by every session waiting on the same key."""
+
+    def __init__(self, key):
+        self.key = key
+        self.owners = set()
+        self.partial = None
+        self.cancelled = threading.Event()
+        self.future = Future()
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes or `timeout` seconds pass; returns whether it finished."""
+        return not wait([self.future], timeout).not_done
+
+    def result(self):
+        return self.future.result()
+
+
+class JobPool:
+    """A shared worker pool running at most one job per owner.
+
+    Work is a generator of partial results whose last one is the result.
+    Submitting a new key for an owner drops it from its previous job, and a
+    job nobody is waiting on any more is cancelled: before it starts, or
+    between two partial results once it runs. Finished results are kept per
+    key, most recent first, for every owner.
+    """
+
+    def __init__(self, max_workers=None, max_results=256):
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix='formulab-job')
+        self.max_results = max_results
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.running = {}
+        self.results = OrderedDict()
+
+    def submit(self, owner, key, work):
+        with self.lock:
+            current = self.jobs.get(owner)
+            if current is not None and current.key == key:
+                return current
+            if current is not None:
+                self._release(owner, current)
+
+            if key in self.results:
+                self.results.move_to_end(key)
+                job = Job(key)
+                job.future.set_result(self.results[key])
+                return job
+
+            job = self.running.get(key)
+            if job is None:
+                job = self.running[key] = Job(key)
+                self.executor.submit(self._run, job, work)
+            job.owners.add(owner)
+            self.jobs[owner] = job
+            return job
+
+    def _release(self, owner, job):
+        del self.jobs[owner]
+        job.owners.discard(owner)
+        if not job.owners:
+            job.cancelled.set()
+            if self.running.get(job.key) is job:
+                del self.running[job.key]
+
+    def _run(self, job, work):
+        try:
+            if job.cancelled.is_set():
+                job.future.cancel()
+                return
+            for partial in work():
+                if job.cancelled.is_set():
+                    job.future.cancel()
+                    return
+                job.partial = partial
+        except Exception as error:
+            job.future.set_exception(error)
+            self._finish(job)
+            return
+
+        with self.lock:
+            self.results[job.key] = job.partial
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+        job.future.set_result(job.partial)
+        self._finish(job)
+
+    def _finish(self, job):
+        # Owners pick the result up from the cache on their next rerun
+        with self.lock:
+            if self.running.get(job.key) is job:
+                del self.running[job.key]
+            for owner in job.owners:
+                if self.jobs.get(owner) is job:
+                    del self.jobs[owner]
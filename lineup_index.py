@@ -0,0 +1,315 @@
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import instrumentation
+from lineups import DRIVER_SLOTS, TEAM_SLOTS, combination_indices, lineup_grid, to_tenths
+
+INDEX_PATH = 'data/lineups.idx'
+
+MAGIC = b'FLABIDX1'
+# The digest is raw bytes: 'S' fields drop trailing NULs, which a SHA-256 can end with
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('digest', 'V32'), ('budget', '<i8'), ('count', '<i8')])
+
+# One record per valid lineup: member bitmasks over the CSV row order,
+# total points and total cost in tenths of a million
+LINEUP_DTYPE = np.dtype([('drivers', '<u8'), ('teams', '<u4'), ('points', '<f8'), ('cost', '<u2')])
+
+# Index records scanned between partial results
+SCAN_CHUNK = 1 << 16
+
+# Work of carrying one indexed lineup over in update_index, in lineups rebuilt
+UPDATE_KEEP_COST = 20
+
+# scanned is how many index records were checked against the selection so far
+SelectionResult = namedtuple('SelectionResult', ['count', 'combinations', 'min_points', 'max_points', 'scanned'])
+
+
+def member_masks(combos):
+    """Bitmask of the members of each row of a subset index array."""
+    bits = np.left_shift(np.uint64(1), combos.astype(np.uint64))
+    return np.bitwise_or.reduce(bits, axis=1)
+
+
+def mask_of(positions):
+    return sum(1 << int(p) for p in positions)
+
+
+def positions_of(mask):
+    mask = int(mask)
+    return [p for p in range(mask.bit_length()) if mask >> p & 1]
+
+
+@instrumentation.timed
+def build_index(registry, max_cost=100):
+    """Every lineup within budget as LINEUP_DTYPE records, most points first.
+
+    Ties keep the itertools enumeration order of the full pools.
+    """
+    drivers, teams = registry.drivers, registry.teams
+    if len(drivers) > 64 or len(teams) > 32:
+        raise ValueError("The lineup index supports at most 64 drivers and 32 teams")
+
+    team_combos = combination_indices(len(teams), TEAM_SLOTS)
+    team_costs = teams.cost_tenths[team_combos].sum(axis=1)
+    team_points = teams.points[team_combos].sum(axis=1)
+
+    driver_combos, total_points, total_cost = lineup_grid(
+        drivers.points,
+        drivers.cost_tenths,
+        team_points,
+        team_costs,
+        DRIVER_SLOTS,
+    )
+
+    valid = np.flatnonzero(total_cost <= to_tenths(max_cost))
+    valid = valid[np.argsort(-total_points.ravel()[valid], kind='stable')]
+    d, t = np.divmod(valid, len(team_combos))
+
+    lineups = np.empty(len(valid), dtype=LINEUP_DTYPE)
+    lineups['drivers'] = member_masks(driver_combos)[d]
+    lineups['teams'] = member_masks(team_combos)[t]
+    lineups['points'] = total_points.ravel()[valid]
+    lineups['cost'] = total_cost.ravel()[valid]
+    return lineups
+
+
+def _rank_tables(n, k):
+    """Per byte of a member mask: the lexicographic rank it adds, by how many members come before it.
+
+    The rank of a subset in itertools order sums C(n-1-p, k-1-i) over every
+    position p it skips while i < k of its members lie before p.
+    """
+    skips = np.array([[math.comb(n - 1 - p, k - 1 - i) if i < k else 0 for i in range(k + 1)] for p in range(n)])
+    bits = np.arange(256)[:, None] >> np.arange(8) & 1
+    tables = []
+    for start in range(0, n, 8):
+        width = min(8, n - start)
+        # Members before each bit: those in earlier bytes plus those below it in this one
+        chosen = np.arange(k + 1)[None, :, None] + (np.cumsum(bits, axis=1) - bits)[:, None, :width]
+        skipped = skips[start + np.arange(width), np.minimum(chosen, k)] * (1 - bits[:, None, :width])
+        tables.append(skipped.sum(axis=2))
+    return np.array(tables)
+
+
+def _combo_rows(masks, n, k):
+    """Row of each k-member mask in combination_indices(n, k), computed a byte at a time."""
+    tables = _rank_tables(n, k).astype(np.int32)
+    popcount = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int32)
+    # Little-endian bytes, so column c holds members 8c to 8c + 7
+    by_byte = np.ascontiguousarray(masks, dtype='<u8').view(np.uint8).reshape(-1, 8)
+    rows = np.zeros(len(masks), dtype=np.int64)
+    before = np.zeros(len(masks), dtype=np.int32)
+    for chunk, table in enumerate(tables):
+        byte = by_byte[:, chunk]
+        rows += table.ravel()[byte * np.int32(k + 1) + before]
+        before += popcount[byte]
+    return rows
+
+
+@instrumentation.timed
+def update_index(index, registry, previous, max_cost=100):
+    """The index for `registry`, updated from the `index` built for `previous` instead of rebuilt.
+
+    Only lineups holding a driver or team whose price changed can enter or
+    leave the budget, so only those are priced again; every other indexed
+    lineup stays and has its points recomputed from its members. Gives the
+    same records as build_index, which it falls back to when the pools
+    changed or when enough prices moved that a rebuild is cheaper.
+    """
+    drivers, teams = registry.drivers, registry.teams
+    if drivers.names != previous.drivers.names or teams.names != previous.teams.names:
+        return build_index(registry, max_cost)
+
+    driver_combos = combination_indices(len(drivers), DRIVER_SLOTS)
+    team_combos = combination_indices(len(teams), TEAM_SLOTS)
+    driver_masks = member_masks(driver_combos)
+    team_masks = member_masks(team_combos)
+    repriced_drivers = np.uint64(mask_of(np.flatnonzero(drivers.cost_tenths != previous.drivers.cost_tenths)))
+    repriced_teams = np.uint64(mask_of(np.flatnonzero(teams.cost_tenths != previous.teams.cost_tenths)))
+    touched_drivers = np.flatnonzero((driver_masks & repriced_drivers) != 0)
+    untouched_drivers = np.flatnonzero((driver_masks & repriced_drivers) == 0)
+    touched_teams = np.flatnonzero((team_masks & repriced_teams) != 0)
+
+    # Repricing costs about as much per lineup as a rebuild, and carrying
+    # the kept lineups over costs a fraction of that per lineup
+    grid_size = len(driver_combos) * len(team_combos)
+    repriced = len(touched_drivers) * len(team_combos) + len(untouched_drivers) * len(touched_teams)
+    instrumentation.count(update_repriced=repriced, update_grid=grid_size)
+    if repriced + UPDATE_KEEP_COST * len(index) >= grid_size:
+        return build_index(registry, max_cost)
+
+    driver_cost = drivers.cost_tenths[driver_combos].sum(axis=1)
+    team_cost = teams.cost_tenths[team_combos].sum(axis=1)
+    budget = to_tenths(max_cost)
+
+    # Lineups within budget, flagged by their position in enumeration order
+    valid = np.zeros(grid_size, dtype=bool)
+    member_drivers = index['drivers']
+    member_teams = index['teams'].astype(np.uint64)
+    kept = ((member_drivers & repriced_drivers) == 0) & ((member_teams & repriced_teams) == 0)
+    valid[
+        _combo_rows(member_drivers[kept], len(drivers), DRIVER_SLOTS) * len(team_combos)
+        + _combo_rows(member_teams[kept], len(teams), TEAM_SLOTS)
+    ] = True
+
+    # Lineups with a repriced member: repriced drivers with any teams, then
+    # the remaining drivers with repriced teams
+    for rows, cols in ((touched_drivers, np.arange(len(team_combos))), (untouched_drivers, touched_teams)):
+        r, c = np.nonzero(driver_cost[rows, None] + team_cost[None, cols] <= budget)
+        valid[rows[r] * len(team_combos) + cols[c]] = True
+
+    # From here on the same steps as build_index, so points and ties match a rebuild
+    valid = np.flatnonzero(valid)
+    d, t = np.divmod(valid, len(team_combos))
+    points = drivers.points[driver_combos].sum(axis=1)[d] + teams.points[team_combos].sum(axis=1)[t]
+    order = np.argsort(-points, kind='stable')
+    d, t = d[order], t[order]
+
+    lineups = np.empty(len(order), dtype=LINEUP_DTYPE)
+    lineups['drivers'] = driver_masks[d]
+    lineups['teams'] = team_masks[t]
+    lineups['points'] = points[order]
+    lineups['cost'] = driver_cost[d] + team_cost[t]
+    return lineups
+
+
+def write_index(lineups, digest, max_cost=100, path=INDEX_PATH):
+    header = np.array([(MAGIC, np.void(digest), to_tenths(max_cost), len(lineups))], dtype=HEADER_DTYPE)
+    # Write next to the target and swap it in, so readers never map a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        header.tofile(f)
+        lineups.astype(LINEUP_DTYPE, copy=False).tofile(f)
+    os.replace(tmp_path, path)
+
+
+def open_index(digest, max_cost=100, path=INDEX_PATH):
+    """Memory-map the index, or return None if it is missing or was built from other data."""
+    if not os.path.exists(path):
+        return None
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if (
+        len(header) == 0
+        or header['magic'][0] != MAGIC
+        or header['digest'][0].tobytes() != digest
+        or header['budget'][0] != to_tenths(max_cost)
+    ):
+        return None
+    count = int(header['count'][0])
+    if count == 0:
+        return np.empty(0, dtype=LINEUP_DTYPE)
+    return np.memmap(path, dtype=LINEUP_DTYPE, mode='r', offset=HEADER_DTYPE.itemsize, shape=(count,))
+
+
+def load_index(registry, max_cost=100, path=INDEX_PATH):
+    """Open the index for the registry, rebuilding it first if it is missing or stale."""
+    digest = registry.digest()
+    index = open_index(digest, max_cost, path)
+    if index is not None:
+        return index
+
+    lineups = build_index(registry, max_cost)
+    try:
+        write_index(lineups, digest, max_cost, path)
+    except OSError:
+        return lineups  # Read-only deployments keep the index in memory
+    index = open_index(digest, max_cost, path)
+    # Another process may have swapped in an index for other data meanwhile
+    return lineups if index is None else index
+
+
+def extreme_lineups(index):
+    """The highest and lowest scoring lineups, each the first in enumeration order on ties."""
+    points = index['points']
+    lowest = int(np.argmax(points == points[-1]))
+    return index[0], index[lowest]
+
+
+def member_names(lineup, registry):
+    drivers = [registry.drivers.names[i] for i in positions_of(lineup['drivers'])]
+    teams = [registry.teams.names[j] for j in positions_of(lineup['teams'])]
+    return drivers, teams
+
+
+class LineupRanks:
+    """Exact rank and percentile of points totals among every indexed lineup."""
+
+    def __init__(self, index):
+        # The index is sorted by descending points, so reversing it gives
+        # the ascending array searchsorted needs
+        self.points = np.ascontiguousarray(index['points'][::-1])
+
+    def __len__(self):
+        return len(self.points)
+
+    def rank(self, points):
+        """1 plus the number of lineups scoring strictly more."""
+        return len(self.points) - np.searchsorted(self.points, points, side='right') + 1
+
+    def percentile(self, points):
+        """Share of lineups scoring at most `points`, in percent."""
+        return np.searchsorted(self.points, points, side='right') / len(self.points) * 100
+
+
+def selection_matches(index, driver_mask=0, team_mask=0, max_cost=None):
+    """Positions of the indexed lineups containing every driver and team in the masks."""
+    matches = (index['drivers'] & np.uint64(driver_mask)) == driver_mask
+    matches &= (index['teams'] & np.uint32(team_mask)) == team_mask
+    if max_cost is not None:
+        matches &= index['cost'] <= to_tenths(max_cost)
+    return np.flatnonzero(matches)
+
+
+def iter_selection(index, registry, selected_drivers=None, selected_teams=None, max_cost=None, top_n=5,
+                   chunk_size=SCAN_CHUNK):
+    """Partial SelectionResults after each chunk of the index, the last one complete.
+
+    The index is sorted by descending points, so the best lineups and the
+    highest total are final as soon as they show up; the count and the
+    lowest total grow as the scan goes on.
+    """
+    drivers, teams = registry.drivers, registry.teams
+    driver_picks = drivers.ids_of(selected_drivers)
+    team_picks = teams.ids_of(selected_teams)
+    driver_mask = mask_of(driver_picks)
+    team_mask = mask_of(team_picks)
+    used_budget = drivers.cost_tenths[driver_picks].sum() + teams.cost_tenths[team_picks].sum()
+
+    count = 0
+    combinations = []
+    highest = lowest = None
+    for start in range(0, len(index), chunk_size):
+        chunk = index[start:start + chunk_size]
+        matches = selection_matches(chunk, driver_mask, team_mask, max_cost)
+        if len(matches):
+            for lineup in chunk[matches[:top_n - len(combinations)]]:
+                added_drivers = positions_of(int(lineup['drivers']) & ~driver_mask)
+                added_teams = positions_of(int(lineup['teams']) & ~team_mask)
+                combinations.append((
+                    tuple(drivers[i] for i in added_drivers),
+                    tuple(teams[j] for j in added_teams),
+                    lineup['points'].item(),
+                    (int(lineup['cost']) - used_budget) / 10,
+                ))
+            # Matches come out in index order, so the extremes are at either end
+            if highest is None:
+                highest = chunk['points'][matches[0]].item()
+            lowest = chunk['points'][matches[-1]].item()
+            count += len(matches)
+        yield SelectionResult(count, list(combinations), lowest, highest, start + len(chunk))
+
+
+@instrumentation.timed
+def evaluate_selection(index, registry, selected_drivers=None, selected_teams=None, max_cost=None, top_n=5):
+    """Count, best lineups and points range for a selection, from one pass over the index.
+
+    The best lineups have the same shape as find_best_combinations results.
+    max_cost may tighten, but not exceed, the budget the index was built with.
+    """
+    result = SelectionResult(0, [], None, None, 0)
+    for result in iter_selection(index, registry, selected_drivers, selected_teams, max_cost, top_n):
+        pass
+    return result
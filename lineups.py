@@ -0,0 +1,458 @@
+import heapq
+import itertools
+import math
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import instrumentation
+
+DRIVER_SLOTS = 5
+TEAM_SLOTS = 2
+
+# Largest top_n answered by branch and bound before falling back to a full scan
+BRANCH_AND_BOUND_MAX_N = 200
+
+# Search constraints beyond the current selections and the cost cap. Excluded
+# drivers and teams are never added, at most max_per_constructor drivers may
+# share a constructor (selected ones included), and lineups cost at least
+# min_cost millions
+Constraints = namedtuple(
+    'Constraints',
+    ['excluded_drivers', 'excluded_teams', 'max_per_constructor', 'min_cost'],
+    defaults=((), (), None, None),
+)
+
+# One lineup on the points/cost frontier; same fields as a find_best_combinations tuple
+FrontierPoint = namedtuple('FrontierPoint', ['drivers', 'teams', 'points', 'cost'])
+
+
+def to_tenths(values):
+    """Convert costs in millions to exact integer tenths of a million."""
+    return np.rint(np.asarray(values, dtype=float) * 10).astype(np.int64)
+
+
+@lru_cache(maxsize=None)
+def combination_indices(n, k):
+    """Return every k-subset of range(n) as rows of a (C(n, k), k) array, in itertools order."""
+    count = math.comb(n, k)
+    flat = np.fromiter(
+        itertools.chain.from_iterable(itertools.combinations(range(n), k)),
+        dtype=np.int64,
+        count=count * k,
+    )
+    indices = flat.reshape(count, k)
+    indices.flags.writeable = False
+    return indices
+
+
+def top_n_indices(values, n):
+    """Indices of the n largest values, highest first, ties broken by lowest index."""
+    if n <= 0 or len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+    if n < len(values):
+        kth = len(values) - n
+        threshold = values[np.argpartition(values, kth)[kth]]
+        candidates = np.flatnonzero(values >= threshold)
+    else:
+        candidates = np.arange(len(values))
+    order = np.lexsort((candidates, -values[candidates]))
+    return candidates[order[:n]]
+
+
+def split_pool(pool, selected, excluded=None):
+    """Ids of the (available, already selected) entities of a pool; excluded ones are never available."""
+    picks = pool.ids_of(selected)
+    return np.setdiff1d(np.arange(len(pool)), np.union1d(picks, pool.ids_of(excluded))), picks
+
+
+def remaining_budget(registry, driver_picks, team_picks, max_cost):
+    """Budget left after the picks, in integer tenths so the check is exact at the cap."""
+    used_budget = registry.drivers.cost_tenths[driver_picks].sum() + registry.teams.cost_tenths[team_picks].sum()
+    return int(to_tenths(max_cost) - used_budget)
+
+
+def constructor_room(drivers, driver_pool, driver_picks, max_per_constructor):
+    """Constructor of each available driver, and how many more drivers each constructor can take.
+
+    Both are None without a cap or a constructor column. Room goes negative
+    when the selected drivers already break the cap.
+    """
+    if max_per_constructor is None or drivers.teams is None:
+        return None, None
+    constructors = np.unique(drivers.teams, return_inverse=True)[1]
+    room = max_per_constructor - np.bincount(constructors[driver_picks], minlength=constructors.max() + 1)
+    return constructors[driver_pool], room
+
+
+def within_room(combos, constructors, room):
+    """Mask of the subsets (rows of positions) that fit in every constructor's room."""
+    picked = constructors[combos]
+    return np.all([(picked == c).sum(axis=1) <= r for c, r in enumerate(room)], axis=0)
+
+
+def _cost_count_table(costs, k, budget):
+    counts = np.zeros((k + 1, budget + 1), dtype=np.int64)
+    counts[0, 0] = 1
+    for cost in costs:
+        if cost > budget:
+            continue
+        # 0/1 knapsack step: every (j-1)-subset extends to a j-subset costing `cost` more
+        counts[1:, cost:] += counts[:-1, :budget + 1 - cost].copy()
+    return counts
+
+
+def subset_cost_counts(costs, k, budget, groups=None, room=None):
+    """Count the k-subsets of costs by total cost, for every total from 0 to budget.
+
+    With groups, a subset holds at most room[g] items of each group g.
+    """
+    if budget < 0:
+        return np.zeros(0, dtype=np.int64)
+    if groups is None:
+        return _cost_count_table(costs, k, budget)[k]
+
+    # Count each group's own subsets up to its room, then fold the groups
+    # together one at a time by convolving over size and cost
+    counts = np.zeros((k + 1, budget + 1), dtype=np.int64)
+    counts[0, 0] = 1
+    for group in np.unique(groups):
+        within = _cost_count_table(costs[groups == group], max(0, min(k, room[group])), budget)
+        merged = np.zeros_like(counts)
+        for size, cost in zip(*np.nonzero(within)):
+            merged[size:, cost:] += within[size, cost] * counts[:k + 1 - size, :budget + 1 - cost]
+        counts = merged
+    return counts[k]
+
+
+def subset_points_by_cost(points, costs, k, budget):
+    """Most points of a subset of points[i:] by size and exact cost, for every i.
+
+    Returns an (n + 1, k + 1, budget + 1) array, -inf where no subset has
+    that size and cost. Suffix tables let subset_at_cost rebuild the
+    earliest subset in itertools order.
+    """
+    n = len(points)
+    best = np.full((n + 1, k + 1, budget + 1), -np.inf)
+    best[n, 0, 0] = 0
+    for i in range(n - 1, -1, -1):
+        best[i] = best[i + 1]
+        cost = int(costs[i])
+        if cost > budget:
+            continue
+        # 0/1 knapsack step: every (j-1)-subset of later items extends with item i
+        best[i, 1:, cost:] = np.maximum(best[i, 1:, cost:], points[i] + best[i + 1, :-1, :budget + 1 - cost])
+    return best
+
+
+def subset_at_cost(best, points, costs, k, cost):
+    """Positions of the earliest k-subset reaching best[0, k, cost] at exactly that cost."""
+    picked = []
+    for i in range(len(points)):
+        if k == 0:
+            break
+        item_cost = int(costs[i])
+        # Recompute the DP's own sum, so the comparison is exact
+        if item_cost <= cost and points[i] + best[i + 1, k - 1, cost - item_cost] == best[i, k, cost]:
+            picked.append(i)
+            k -= 1
+            cost -= item_cost
+    return picked
+
+
+def lineup_grid(driver_points, driver_costs, team_points, team_costs, slots, driver_combos=None):
+    """Score every driver subset against every team subset at once.
+
+    Returns the driver subsets (every one unless driver_combos is given) plus
+    (driver subsets x team subsets) arrays of total points and cost. Ravel
+    order matches the nested driver/team enumeration, so flat indices keep
+    tie-breaking stable.
+    """
+    if driver_combos is None:
+        driver_combos = combination_indices(len(driver_points), slots)
+    combo_cost = driver_costs[driver_combos].sum(axis=1)
+    combo_points = driver_points[driver_combos].sum(axis=1)
+
+    total_cost = combo_cost[:, None] + team_costs[None, :]
+    total_points = combo_points[:, None] + team_points[None, :]
+    return driver_combos, total_points, total_cost
+
+
+def grid_top_n(driver_points, driver_costs, team_points, team_costs, slots, budget, top_n,
+               min_budget=None, constructors=None, room=None):
+    """Best lineups by scoring the whole grid of driver and team subsets.
+
+    Takes the available drivers' points and costs, the candidate team subsets'
+    points and costs, and the number of driver slots to fill. Lineups must
+    cost between min_budget (when given) and budget, and when constructors
+    and room are given, driver subsets over a constructor's room are dropped
+    before scoring. Returns up to top_n (points, driver positions, team
+    subset, cost) tuples, best first.
+    """
+    driver_combos = combination_indices(len(driver_points), slots)
+    if constructors is not None:
+        driver_combos = driver_combos[within_room(driver_combos, constructors, room)]
+    driver_combos, total_points, total_cost = lineup_grid(
+        driver_points, driver_costs, team_points, team_costs, slots, driver_combos
+    )
+
+    fits = total_cost <= budget
+    if min_budget is not None:
+        fits &= total_cost >= min_budget
+    valid = np.flatnonzero(fits)
+    instrumentation.count(grid_scored=total_cost.size, grid_valid=len(valid))
+    best = valid[top_n_indices(total_points.ravel()[valid], top_n)]
+
+    lineups = []
+    for flat in best:
+        d, t = divmod(int(flat), len(team_points))
+        lineups.append((total_points[d, t].item(), tuple(driver_combos[d].tolist()), t, total_cost[d, t].item()))
+    return lineups
+
+
+def top_k_lineups(driver_points, driver_costs, team_points, team_costs, slots, budget, k,
+                  min_budget=None, constructors=None, room=None):
+    """Best k lineups by branch and bound, holding at most k candidates at a time.
+
+    Same inputs and output as grid_top_n. Drivers are explored in order of
+    points, and a subtree is skipped once its best possible total (its points
+    so far plus the top remaining drivers and the best team subset) can no
+    longer make the top k, once its cheapest completion is over budget or its
+    priciest one under min_budget, or when its next driver's constructor has
+    no room left.
+    """
+    if k <= 0 or len(team_points) == 0:
+        return []
+
+    order = np.argsort(-driver_points, kind='stable')
+    positions = order.tolist()
+    points = driver_points[order].tolist()
+    costs = driver_costs[order].tolist()
+    n = len(points)
+
+    # prefix[i + r] - prefix[i] is the most points r drivers from i onwards can add,
+    # cheapest[i][r] the least they can cost
+    prefix = [0, *itertools.accumulate(points)]
+    cheapest = [[0, *itertools.accumulate(sorted(costs[i:]))] for i in range(n + 1)]
+    if min_budget is not None:
+        priciest = [[0, *itertools.accumulate(sorted(costs[i:], reverse=True))] for i in range(n + 1)]
+        priciest_team = int(team_costs.max())
+    if constructors is not None:
+        constructors = constructors[order].tolist()
+        room = room.tolist()
+
+    team_order = np.argsort(-team_points, kind='stable').tolist()
+    teams = [(team_points[j].item(), team_costs[j].item(), j) for j in team_order]
+    best_team = teams[0][0]
+    cheapest_team = int(team_costs.min())
+
+    # Min-heap of (points, tiebreak, cost); the tiebreak negates positions so that,
+    # at equal points, the lineup earlier in itertools order compares greater
+    heap = []
+    # Driver subsets entered, branches cut by a bound and complete lineups scored
+    nodes = pruned = scored = 0
+
+    def complete(picked, pts, cost):
+        nonlocal scored
+        tiebreak = tuple(-p for p in sorted(picked))
+        for t_pts, t_cost, j in teams:
+            total = pts + t_pts
+            if len(heap) == k and total < heap[0][0]:
+                break
+            if cost + t_cost > budget or (min_budget is not None and cost + t_cost < min_budget):
+                continue
+            scored += 1
+            entry = (total, tiebreak + (-j,), cost + t_cost)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    def visit(start, remaining, picked, pts, cost):
+        nonlocal nodes, pruned
+        if remaining == 0:
+            complete(picked, pts, cost)
+            return
+        for i in range(start, n - remaining + 1):
+            # Bounds only shrink further down the points order, so stop at the first miss
+            bound = pts + prefix[i + remaining] - prefix[i] + best_team
+            if len(heap) == k and bound < heap[0][0]:
+                pruned += n - remaining + 1 - i
+                break
+            if cost + costs[i] + cheapest[i + 1][remaining - 1] + cheapest_team > budget:
+                pruned += 1
+                continue
+            if min_budget is not None and cost + costs[i] + priciest[i + 1][remaining - 1] + priciest_team < min_budget:
+                pruned += 1
+                continue
+            if constructors is not None:
+                if room[constructors[i]] <= 0:
+                    pruned += 1
+                    continue
+                room[constructors[i]] -= 1
+            nodes += 1
+            picked.append(positions[i])
+            visit(i + 1, remaining - 1, picked, pts + points[i], cost + costs[i])
+            picked.pop()
+            if constructors is not None:
+                room[constructors[i]] += 1
+
+    visit(0, slots, [], 0, 0)
+    instrumentation.count(branch_and_bound_nodes=nodes, branch_and_bound_pruned=pruned, branch_and_bound_scored=scored)
+
+    return [
+        (total, tuple(-p for p in tiebreak[:-1]), -tiebreak[-1], cost)
+        for total, tiebreak, cost in sorted(heap, reverse=True)
+    ]
+
+
+@instrumentation.timed
+def find_best_combinations(registry, selected_drivers=None, selected_teams=None, max_cost=100, top_n=5,
+                           rank_by='points', scenarios=None, constraints=None):
+    # Scenario metrics (see scenarios.SCENARIO_METRICS) need sampled
+    # scenarios and add each lineup's ScenarioStats to its tuple
+    if rank_by != 'points':
+        from scenarios import find_best_by_scenarios
+        if scenarios is None:
+            raise ValueError(f"Ranking by {rank_by!r} needs scenarios from sample_scenarios")
+        return find_best_by_scenarios(
+            registry, scenarios, selected_drivers, selected_teams, max_cost, top_n, rank_by, constraints
+        )
+
+    # Constraints (see Constraints) shrink the pools and prune inside the search
+    constraints = constraints or Constraints()
+    drivers, teams = registry.drivers, registry.teams
+    driver_pool, driver_picks = split_pool(drivers, selected_drivers, constraints.excluded_drivers)
+    team_pool, team_picks = split_pool(teams, selected_teams, constraints.excluded_teams)
+    constructors, room = constructor_room(drivers, driver_pool, driver_picks, constraints.max_per_constructor)
+    if room is not None and (room < 0).any():
+        return []
+
+    budget = remaining_budget(registry, driver_picks, team_picks, max_cost)
+    min_budget = None
+    if constraints.min_cost is not None:
+        min_budget = remaining_budget(registry, driver_picks, team_picks, constraints.min_cost)
+    selected_points = drivers.points[driver_picks].sum() + teams.points[team_picks].sum()
+
+    remaining_drivers = DRIVER_SLOTS - len(selected_drivers or [])
+    remaining_teams = TEAM_SLOTS - len(selected_teams or [])
+
+    team_combos = team_pool[combination_indices(len(team_pool), remaining_teams)]
+    team_cost = teams.cost_tenths[team_combos].sum(axis=1)
+    team_points = teams.points[team_combos].sum(axis=1)
+
+    # Branch and bound keeps memory bounded by top_n; past a few hundred results
+    # it visits most of the space anyway and the vectorized scan is faster
+    solver = top_k_lineups if top_n <= BRANCH_AND_BOUND_MAX_N else grid_top_n
+    best = solver(
+        drivers.points[driver_pool],
+        drivers.cost_tenths[driver_pool],
+        team_points,
+        team_cost,
+        remaining_drivers,
+        budget,
+        top_n,
+        min_budget,
+        constructors,
+        room,
+    )
+
+    return [
+        (
+            tuple(drivers[driver_pool[i]] for i in combo),
+            tuple(teams[j] for j in team_combos[team_combo]),
+            selected_points.item() + points,
+            cost / 10,
+        )
+        for points, combo, team_combo, cost in best
+    ]
+
+
+@instrumentation.timed
+def count_valid_combinations(registry, selected_drivers=None, selected_teams=None, max_cost=100,
+                             constraints=None):
+    constraints = constraints or Constraints()
+    drivers, teams = registry.drivers, registry.teams
+    driver_pool, driver_picks = split_pool(drivers, selected_drivers, constraints.excluded_drivers)
+    team_pool, team_picks = split_pool(teams, selected_teams, constraints.excluded_teams)
+    constructors, room = constructor_room(drivers, driver_pool, driver_picks, constraints.max_per_constructor)
+    if room is not None and (room < 0).any():
+        return 0
+
+    budget = remaining_budget(registry, driver_picks, team_picks, max_cost)
+    min_budget = remaining_budget(registry, driver_picks, team_picks, constraints.min_cost or 0)
+    if budget < max(0, min_budget):
+        return 0
+
+    remaining_drivers = DRIVER_SLOTS - len(selected_drivers or [])
+    remaining_teams = TEAM_SLOTS - len(selected_teams or [])
+
+    # Count subsets per cost bucket on each side, then pair every driver cost
+    # with all team subsets that land the total between the floor and the budget
+    driver_counts = subset_cost_counts(
+        drivers.cost_tenths[driver_pool], remaining_drivers, budget, constructors, room
+    )
+    team_counts = subset_cost_counts(teams.cost_tenths[team_pool], remaining_teams, budget)
+    instrumentation.count(count_cost_buckets=len(driver_counts) + len(team_counts))
+    teams_within = np.r_[0, np.cumsum(team_counts)]
+    driver_cost = np.arange(budget + 1)
+    lowest_team_cost = np.clip(min_budget - driver_cost, 0, None)
+    return int(driver_counts @ (teams_within[budget + 1 - driver_cost] - teams_within[lowest_team_cost]))
+
+
+@instrumentation.timed
+def pareto_frontier(registry, selected_drivers=None, selected_teams=None, max_cost=100):
+    """Lineups on the points/cost frontier: each scores more than any cheaper lineup.
+
+    One pass of dynamic programming over cost in tenths of a million, per
+    side, then a max-plus merge of the driver and team tables, so the cost
+    is linear in the pool size rather than in the number of lineups.
+    Returns FrontierPoints from cheapest to most expensive; points include
+    the current selections and cost covers only the additions, as in
+    find_best_combinations.
+    """
+    drivers, teams = registry.drivers, registry.teams
+    driver_pool, driver_picks = split_pool(drivers, selected_drivers)
+    team_pool, team_picks = split_pool(teams, selected_teams)
+
+    budget = remaining_budget(registry, driver_picks, team_picks, max_cost)
+    if budget < 0:
+        return []
+    selected_points = drivers.points[driver_picks].sum() + teams.points[team_picks].sum()
+
+    remaining_drivers = DRIVER_SLOTS - len(selected_drivers or [])
+    remaining_teams = TEAM_SLOTS - len(selected_teams or [])
+
+    driver_points, driver_costs = drivers.points[driver_pool], drivers.cost_tenths[driver_pool]
+    team_points, team_costs = teams.points[team_pool], teams.cost_tenths[team_pool]
+    driver_best = subset_points_by_cost(driver_points, driver_costs, remaining_drivers, budget)
+    team_best = subset_points_by_cost(team_points, team_costs, remaining_teams, budget)
+
+    # Best total at each exact cost, and the team cost it splits off at
+    total = np.full(budget + 1, -np.inf)
+    team_split = np.zeros(budget + 1, dtype=np.int64)
+    by_driver_cost = driver_best[0, remaining_drivers]
+    for team_cost in np.flatnonzero(np.isfinite(team_best[0, remaining_teams])):
+        candidate = team_best[0, remaining_teams, team_cost] + by_driver_cost[:budget + 1 - team_cost]
+        better = candidate > total[team_cost:]
+        total[team_cost:][better] = candidate[better]
+        team_split[team_cost:][better] = team_cost
+
+    instrumentation.count(frontier_cost_levels=int(np.isfinite(total).sum()))
+    frontier = []
+    best_so_far = -np.inf
+    for cost in np.flatnonzero(np.isfinite(total)):
+        if total[cost] <= best_so_far:
+            continue
+        best_so_far = total[cost]
+        team_cost = team_split[cost]
+        combo = subset_at_cost(driver_best, driver_points, driver_costs, remaining_drivers, cost - team_cost)
+        team_combo = subset_at_cost(team_best, team_points, team_costs, remaining_teams, team_cost)
+        frontier.append(FrontierPoint(
+            tuple(drivers[driver_pool[i]] for i in combo),
+            tuple(teams[team_pool[j]] for j in team_combo),
+            selected_points.item() + total[cost].item(),
+            cost.item() / 10,
+        ))
+    return frontier
@@ -0,0 +1,87 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from races import RACES_PATH, apply_window, load_results
+from registry import EntityPool, Registry
+
+DATA_FILES = ('data/f1_fantasy_drivers.csv', 'data/f1_fantasy_teams.csv')
+SNAPSHOT_PATH = 'data/registry.npz'
+
+def data_digest(paths=DATA_FILES, salt=b''):
+    """SHA-256 of the input files, to tell when something derived from them is stale."""
+    digest = hashlib.sha256(salt)
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+def load_data(drivers_path=DATA_FILES[0], teams_path=DATA_FILES[1]):
+    drivers_df = pd.read_csv(drivers_path)
+    teams_df = pd.read_csv(teams_path)
+    
+    # Title case for driver names
+    drivers_df['driver'] = drivers_df['driver'].str.replace('_', ' ').str.title()
+    
+    # Title case for team names
+    teams_df['team'] = teams_df['team'].str.replace('_', ' ').str.title()
+    
+    # Drivers' constructors, matching the team names
+    if 'team' in drivers_df:
+        drivers_df['team'] = drivers_df['team'].str.replace('_', ' ').str.title()
+    
+    return drivers_df, teams_df
+
+# The registry's arrays in one .npz, so startup skips parsing the CSVs
+def write_snapshot(registry, digest, path=SNAPSHOT_PATH):
+    arrays = {'digest': np.frombuffer(digest, dtype=np.uint8)}
+    for prefix, pool in (('driver', registry.drivers), ('team', registry.teams)):
+        arrays[f'{prefix}_names'] = np.array(pool.names, dtype=str)
+        arrays[f'{prefix}_points'] = pool.points
+        arrays[f'{prefix}_cost'] = pool.cost
+        if pool.points_std is not None:
+            arrays[f'{prefix}_points_std'] = pool.points_std
+    if registry.drivers.teams is not None:
+        arrays['driver_teams'] = np.array(registry.drivers.teams, dtype=str)
+    # Write next to the target and swap it in, like the lineup index
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def read_snapshot(digest, path=SNAPSHOT_PATH):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as snapshot:
+        if snapshot['digest'].tobytes() != digest:
+            return None
+        def pool(prefix, teams=None):
+            return EntityPool(
+                snapshot[f'{prefix}_names'].tolist(),
+                snapshot[f'{prefix}_points'],
+                snapshot[f'{prefix}_cost'],
+                teams=teams,
+                points_std=snapshot[f'{prefix}_points_std'] if f'{prefix}_points_std' in snapshot else None,
+            )
+        driver_teams = snapshot['driver_teams'].tolist() if 'driver_teams' in snapshot else None
+        return Registry(pool('driver', driver_teams), pool('team'))
+
+# `window` (see races.ScoringWindow) scores on stored race results instead of the CSVs' points
+def load_registry(drivers_path=DATA_FILES[0], teams_path=DATA_FILES[1], window=None,
+                  races_path=RACES_PATH, snapshot_path=SNAPSHOT_PATH):
+    sources = [drivers_path, teams_path]
+    if window is not None and os.path.exists(races_path):
+        sources.append(races_path)
+    digest = data_digest(sources, salt=repr(window).encode())
+    
+    registry = read_snapshot(digest, snapshot_path)
+    if registry is None:
+        registry = Registry.from_frames(*load_data(drivers_path, teams_path))
+        if window is not None:
+            registry = apply_window(registry, load_results(races_path), window)
+        try:
+            write_snapshot(registry, digest, snapshot_path)
+        except OSError:
+            pass  # Read-only deployments parse the CSVs each time
+    return registry
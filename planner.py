@@ -0,0 +1,214 @@
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from lineups import DRIVER_SLOTS, TEAM_SLOTS, combination_indices, to_tenths, top_k_lineups
+from loaders import load_registry
+from races import DEFAULT_WINDOW, parse_window
+
+RacePlan = namedtuple('RacePlan', ['drivers', 'teams', 'points', 'transfers'])
+SeasonPlan = namedtuple('SeasonPlan', ['races', 'points', 'transfers'])
+
+
+def flat_projections(registry, races=24):
+    """Spread each driver's and team's season points evenly over the races."""
+    driver_projections = np.tile(registry.drivers.points / races, (races, 1))
+    team_projections = np.tile(registry.teams.points / races, (races, 1))
+    return driver_projections, team_projections
+
+
+def load_projections(path, registry):
+    """Read per-race projected points from a CSV with race, name and points columns.
+
+    Names go through the same normalization as load_data. Returns (races x
+    drivers) and (races x teams) arrays indexed by entity id, with races in
+    sorted order and missing entries projected at 0 points.
+    """
+    projections = pd.read_csv(path)
+    names = projections['name'].str.replace('_', ' ').str.title()
+    races = np.sort(projections['race'].unique())
+    race_pos = pd.Index(races).get_indexer(projections['race'])
+    driver_pos = np.array([registry.drivers.ids.get(name, -1) for name in names], dtype=np.int64)
+    team_pos = np.array([registry.teams.ids.get(name, -1) for name in names], dtype=np.int64)
+
+    unknown = (driver_pos < 0) & (team_pos < 0)
+    if unknown.any():
+        raise ValueError(f"Unknown drivers or teams in {path}: {', '.join(sorted(set(names[unknown])))}")
+
+    points = projections['points'].to_numpy(dtype=float)
+    driver_projections = np.zeros((len(races), len(registry.drivers)))
+    team_projections = np.zeros((len(races), len(registry.teams)))
+    is_driver = driver_pos >= 0
+    driver_projections[race_pos[is_driver], driver_pos[is_driver]] = points[is_driver]
+    team_projections[race_pos[~is_driver], team_pos[~is_driver]] = points[~is_driver]
+    return driver_projections, team_projections
+
+
+def _pareto_states(lineups, used, points):
+    """Indices of the states not dominated by another state holding the same lineup.
+
+    A state is dominated when another one with the same lineup has at least
+    as many points for no more transfers used.
+    """
+    order = np.lexsort((-points, used, lineups))
+    lineups, points = lineups[order], points[order]
+
+    # Running max of points within each lineup group, offset per group so a
+    # single accumulate never carries a max across groups
+    new_group = np.r_[True, lineups[1:] != lineups[:-1]]
+    group = np.cumsum(new_group) - 1
+    scaled = points + group * (points.max() - points.min() + 1)
+    previous_best = np.r_[-np.inf, np.maximum.accumulate(scaled)[:-1]]
+    return order[new_group | (scaled > previous_best)]
+
+
+def plan_season(registry, driver_projections, team_projections, max_cost=100,
+                transfers_per_race=2, total_transfers=None, top_k=30):
+    """Best sequence of lineups over a season of races, by dynamic programming.
+
+    Projections are (races x entities) arrays indexed by entity id. The
+    first lineup is free; after that each race may swap at most
+    transfers_per_race drivers or teams, and at most total_transfers over
+    the season when given. States are the top_k lineups of each race plus
+    the lineups already held, and a state is dropped when another state with
+    the same lineup has at least its points for no more transfers, or when
+    even the best remaining races cannot lift it above the best plan that
+    simply holds a lineup to the end. Returns None when no lineup fits the
+    budget.
+    """
+    n_drivers = len(registry.drivers)
+    n_races = len(driver_projections)
+    if n_races == 0:
+        return SeasonPlan([], 0.0, 0)
+    slots = DRIVER_SLOTS + TEAM_SLOTS
+    budget = int(to_tenths(max_cost))
+    driver_costs = registry.drivers.cost_tenths
+    team_combos = combination_indices(len(registry.teams), TEAM_SLOTS)
+    team_combo_costs = registry.teams.cost_tenths[team_combos].sum(axis=1)
+    projections = np.hstack([driver_projections, team_projections])
+
+    # Every lineup seen so far, as rows of a 0/1 membership matrix over drivers then teams
+    memberships = []
+    lineup_ids = {}
+
+    race_candidates = []
+    race_best = np.zeros(n_races)
+    for race in range(n_races):
+        best = top_k_lineups(
+            driver_projections[race],
+            driver_costs,
+            team_projections[race][team_combos].sum(axis=1),
+            team_combo_costs,
+            DRIVER_SLOTS,
+            budget,
+            top_k,
+        )
+        if not best:
+            return None
+        ids = []
+        for _, drivers, team_combo, _ in best:
+            row = np.zeros(projections.shape[1], dtype=np.float32)
+            row[list(drivers)] = 1
+            row[n_drivers + team_combos[team_combo]] = 1
+            ids.append(lineup_ids.setdefault(row.tobytes(), len(memberships)))
+            if ids[-1] == len(memberships):
+                memberships.append(row)
+        race_candidates.append(np.array(ids))
+        race_best[race] = best[0][0]
+
+    memberships = np.array(memberships)
+    # Points still to come after each race: the best possible per race, and per entity
+    future_best = np.r_[np.cumsum(race_best[::-1])[::-1], 0][1:]
+    future_held = np.vstack([np.cumsum(projections[::-1], axis=0)[::-1], np.zeros(projections.shape[1])])[1:]
+
+    lineups = race_candidates[0]
+    points = memberships[lineups] @ projections[0]
+    used = np.zeros(len(lineups), dtype=np.int64)
+    history = [(lineups, np.full(len(lineups), -1), points, used)]
+
+    for race in range(1, n_races):
+        candidates = np.union1d(race_candidates[race], lineups)
+        overlap = memberships[lineups] @ memberships[candidates].T
+        transfers = slots - np.rint(overlap).astype(np.int64)
+        feasible = transfers <= transfers_per_race
+        if total_transfers is not None:
+            feasible &= used[:, None] + transfers <= total_transfers
+        parents, picks = np.nonzero(feasible)
+
+        lineups = candidates[picks]
+        points = points[parents] + memberships[lineups] @ projections[race]
+        used = used[parents] + transfers[parents, picks]
+
+        keep = _pareto_states(lineups, used, points)
+        lineups, points, used, parents = lineups[keep], points[keep], used[keep], parents[keep]
+
+        # Holding the lineup to the end is always allowed, so it bounds the season
+        # from below; the slack keeps float rounding from pruning the best state
+        held_best = (points + memberships[lineups] @ future_held[race]).max()
+        keep = points + future_best[race] >= held_best - 1e-9 * max(1, abs(held_best))
+        lineups, points, used, parents = lineups[keep], points[keep], used[keep], parents[keep]
+        history.append((lineups, parents, points, used))
+
+    # Most points, then fewest transfers
+    state = int(np.lexsort((used, -points))[0])
+    plan = []
+    for race in range(n_races - 1, -1, -1):
+        lineups, parents, points, used = history[race]
+        plan.append((lineups[state], points[state], used[state]))
+        state = parents[state]
+    plan.reverse()
+
+    races = []
+    for race, (lineup, total, transfers_used) in enumerate(plan):
+        members = memberships[lineup]
+        races.append(RacePlan(
+            tuple(registry.drivers.names[i] for i in np.flatnonzero(members[:n_drivers])),
+            tuple(registry.teams.names[j] for j in np.flatnonzero(members[n_drivers:])),
+            float(members @ projections[race]),
+            int(transfers_used - (plan[race - 1][2] if race else 0)),
+        ))
+    return SeasonPlan(races, float(plan[-1][1]), int(plan[-1][2]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan F1 Fantasy lineups over a season under transfer limits.")
+    parser.add_argument('--projections', help="CSV of race, name, points; defaults to the window's points spread evenly")
+    parser.add_argument('--races', type=int, default=24, help="races to plan when no projections are given")
+    parser.add_argument('--budget', type=float, default=100, help="cost cap in millions")
+    parser.add_argument('--transfers', type=int, default=2, help="transfers allowed per race")
+    parser.add_argument('--total-transfers', type=int, help="transfers allowed over the season")
+    parser.add_argument('--top-k', type=int, default=30, help="candidate lineups per race")
+    parser.add_argument('--window', default=DEFAULT_WINDOW,
+                        help="points and prices from stored race results: season, last:N, blend:D or baseline")
+    args = parser.parse_args()
+
+    registry = load_registry(window=parse_window(args.window))
+    if args.projections:
+        driver_projections, team_projections = load_projections(args.projections, registry)
+    else:
+        driver_projections, team_projections = flat_projections(registry, args.races)
+
+    start = time.perf_counter()
+    plan = plan_season(
+        registry, driver_projections, team_projections,
+        args.budget, args.transfers, args.total_transfers, args.top_k,
+    )
+    elapsed = time.perf_counter() - start
+
+    if plan is None:
+        print("No lineup fits the budget.")
+        return
+
+    for race, lineup in enumerate(plan.races, 1):
+        print(
+            f"Race {race}: {lineup.points:.1f} points, {lineup.transfers} transfers | "
+            f"{', '.join(lineup.drivers)} + {' and '.join(lineup.teams)}"
+        )
+    print(f"\nSeason: {plan.points:.1f} points with {plan.transfers} transfers (planned in {elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from registry import EntityPool, Registry
+
+RACES_PATH = 'data/race_results.csv'
+RACE_COLUMNS = ['season', 'race', 'name', 'points', 'cost']
+
+# How race results turn into the points the solvers rank by:
+#   season    points from every race of the latest season
+#   last:N    points from the last N races, across seasons
+#   blend:D   every race, each weighted D times the race after it
+ScoringWindow = namedtuple('ScoringWindow', ['kind', 'size'], defaults=(None,))
+WINDOW_KINDS = ('season', 'last', 'blend')
+
+# Shared by the app, compute_stats.py and ingest_race.py so they all build the
+# same index; before any race is recorded it scores like 'baseline'
+DEFAULT_WINDOW = 'season'
+
+
+def parse_window(text):
+    """A ScoringWindow from text like 'season', 'last:5' or 'blend:0.8'; None for 'baseline'."""
+    if not text or text == 'baseline':
+        return None
+    kind, _, size = text.partition(':')
+    if kind not in WINDOW_KINDS or (kind == 'season') != (size == ''):
+        raise ValueError(f"Unknown scoring window {text!r}, expected baseline, season, last:N or blend:D")
+    if kind == 'last':
+        return ScoringWindow(kind, int(size))
+    if kind == 'blend':
+        return ScoringWindow(kind, float(size))
+    return ScoringWindow(kind)
+
+
+def _normalize(names):
+    # Same normalization as load_data
+    return names.str.replace('_', ' ').str.title()
+
+
+def load_results(path=RACES_PATH):
+    """Every stored race result, in race order; empty when nothing has been recorded yet.
+
+    Rows are one driver or team per race: season, race, name, points, and
+    the cost for that race where the price changed (blank otherwise).
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=RACE_COLUMNS)
+    results = pd.read_csv(path)
+    results['name'] = _normalize(results['name'])
+    return results.sort_values(['season', 'race'], kind='stable', ignore_index=True)
+
+
+def append_results(results, path=RACES_PATH, registry=None):
+    """Add one or more races to the store; races already recorded are rejected, never rewritten.
+
+    With a registry, results naming an unknown driver or team are rejected too.
+    """
+    results = results.reindex(columns=RACE_COLUMNS)
+    if registry is not None:
+        names = _normalize(results['name'])
+        unknown = ~names.isin(registry.drivers.ids.keys() | registry.teams.ids.keys())
+        if unknown.any():
+            raise ValueError(f"Unknown drivers or teams in race results: {', '.join(sorted(set(names[unknown])))}")
+    stored = load_results(path)
+    known = pd.MultiIndex.from_frame(stored[['season', 'race']])
+    repeated = pd.MultiIndex.from_frame(results[['season', 'race']]).isin(known)
+    if repeated.any():
+        races = sorted({f"{season} race {race}" for season, race in results[repeated][['season', 'race']].itertuples(index=False)})
+        raise ValueError(f"Results already recorded for {', '.join(races)}")
+    results.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+
+def describe_window(window, results):
+    """What points are scored on under a window, as a phrase like '2024 season points'."""
+    if window is None or results.empty:
+        return "2024 season points"
+    races = results[['season', 'race']].drop_duplicates()
+
+    def count(n):
+        return f"{n} race" if n == 1 else f"{n} races"
+
+    if window.kind == 'season':
+        season = races['season'].iloc[-1]
+        return f"points from the {count(int((races['season'] == season).sum()))} of the {season} season so far"
+    if window.kind == 'last':
+        return f"points from the last {count(min(window.size, len(races)))}"
+    return f"points from all {count(len(races))} recorded, each weighted {window.size:g} times the race after it"
+
+
+def race_weights(races, window):
+    """Weight of each race, given as (season, race) rows in race order, under a window."""
+    n_races = len(races)
+    if window.kind == 'season':
+        return (races['season'] == races['season'].iloc[-1]).to_numpy(dtype=float)
+    if window.kind == 'last':
+        return (np.arange(n_races) >= n_races - window.size).astype(float)
+    return window.size ** np.arange(n_races - 1, -1, -1, dtype=float)
+
+
+def apply_window(registry, results, window):
+    """A registry scored on the race results in the window, at the latest prices.
+
+    Entities without results in the window score 0; prices fall back to the
+    registry's where no race changed them. A None window or an empty store
+    leaves the registry as it is.
+    """
+    if window is None or results.empty:
+        return registry
+
+    races = results[['season', 'race']].drop_duplicates(ignore_index=True)
+    race_pos = pd.MultiIndex.from_frame(races).get_indexer(pd.MultiIndex.from_frame(results[['season', 'race']]))
+    weighted = results['points'].to_numpy(dtype=float) * race_weights(races, window)[race_pos]
+
+    def rescored(pool):
+        ids = np.array([pool.ids.get(name, -1) for name in results['name']], dtype=np.int64)
+        mine = ids >= 0
+        points = np.zeros(len(pool))
+        np.add.at(points, ids[mine], weighted[mine])
+
+        # Results are in race order, so the last priced row per entity is its current price
+        cost = pool.cost.copy()
+        priced = mine & results['cost'].notna().to_numpy()
+        prices = pd.Series(results['cost'].to_numpy(dtype=float)[priced], index=ids[priced])
+        prices = prices[~prices.index.duplicated(keep='last')]
+        cost[prices.index] = prices.to_numpy()
+        return points, cost, mine
+
+    driver_points, driver_cost, is_driver = rescored(registry.drivers)
+    team_points, team_cost, is_team = rescored(registry.teams)
+    unknown = ~(is_driver | is_team)
+    if unknown.any():
+        raise ValueError(f"Unknown drivers or teams in race results: {', '.join(sorted(set(results['name'][unknown])))}")
+
+    drivers = EntityPool(
+        registry.drivers.names, driver_points, driver_cost,
+        teams=registry.drivers.teams, points_std=registry.drivers.points_std,
+    )
+    teams = EntityPool(registry.teams.names, team_points, team_cost, points_std=registry.teams.points_std)
+    return Registry(drivers, teams)
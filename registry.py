@@ -0,0 +1,95 @@
+import hashlib
+
+import numpy as np
+
+from lineups import to_tenths
+
+
+class Entity:
+    """One driver or team; `team` is the driver's constructor and None for teams."""
+
+    __slots__ = ('id', 'name', 'points', 'cost', 'team')
+
+    def __init__(self, id, name, points, cost, team=None):
+        self.id = id
+        self.name = name
+        self.points = points
+        self.cost = cost
+        self.team = team
+
+    def __repr__(self):
+        return f"Entity({self.id}, {self.name!r}, points={self.points}, cost={self.cost})"
+
+
+class EntityPool:
+    """Drivers or teams with integer ids, array-backed columns and O(1) name lookup.
+
+    Ids are row positions in the source data, so every array is indexed by id.
+    """
+
+    __slots__ = ('names', 'points', 'points_std', 'cost', 'cost_tenths', 'teams', 'ids', 'records')
+
+    def __init__(self, names, points, cost, teams=None, points_std=None):
+        self.names = list(names)
+        self.points = np.asarray(points)
+        self.points_std = None if points_std is None else np.asarray(points_std, dtype=float)
+        self.cost = np.asarray(cost, dtype=float)
+        self.cost_tenths = to_tenths(self.cost)
+        self.teams = None if teams is None else list(teams)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.records = [
+            Entity(i, name, self.points[i].item(), self.cost[i].item(), self.teams[i] if self.teams else None)
+            for i, name in enumerate(self.names)
+        ]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, id):
+        return self.records[id]
+
+    def get(self, name):
+        return self.records[self.ids[name]]
+
+    def ids_of(self, names):
+        """Ids of the known names, in ascending order; unknown names are ignored."""
+        return np.array(sorted({self.ids[name] for name in names or [] if name in self.ids}), dtype=np.int64)
+
+
+class Registry:
+    """The driver and team pools, built once when the data is loaded."""
+
+    __slots__ = ('drivers', 'teams')
+
+    def __init__(self, drivers, teams):
+        self.drivers = drivers
+        self.teams = teams
+
+    @classmethod
+    def from_frames(cls, drivers_df, teams_df, points_column='points_2024'):
+        def optional(df, column):
+            return df[column].to_numpy() if column in df else None
+
+        drivers = EntityPool(
+            drivers_df['driver'],
+            drivers_df[points_column].to_numpy(),
+            drivers_df['cost'].to_numpy(),
+            teams=optional(drivers_df, 'team'),
+            points_std=optional(drivers_df, 'points_std'),
+        )
+        teams = EntityPool(
+            teams_df['team'],
+            teams_df[points_column].to_numpy(),
+            teams_df['cost'].to_numpy(),
+            points_std=optional(teams_df, 'points_std'),
+        )
+        return cls(drivers, teams)
+
+    def digest(self):
+        """SHA-256 of the names, points and costs, which is everything the lineup index depends on."""
+        digest = hashlib.sha256()
+        for pool in (self.drivers, self.teams):
+            digest.update('\0'.join(pool.names).encode())
+            digest.update(pool.points.astype(np.float64).tobytes())
+            digest.update(pool.cost_tenths.tobytes())
+        return digest.digest()
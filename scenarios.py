@@ -0,0 +1,148 @@
+from collections import namedtuple
+
+import numpy as np
+
+import instrumentation
+from lineups import (
+    DRIVER_SLOTS,
+    TEAM_SLOTS,
+    Constraints,
+    combination_indices,
+    constructor_room,
+    remaining_budget,
+    split_pool,
+    top_n_indices,
+    within_room,
+)
+
+# Downside percentiles reported for every scored lineup
+DOWNSIDE_PERCENTILES = (5, 10, 25)
+SCENARIO_METRICS = ('expected', 'std', 'p5', 'p10', 'p25')
+
+# Lineups x scenarios scores held at once; bounds memory whatever the pool size
+CHUNK_ELEMENTS = 1 << 22
+
+ScenarioStats = namedtuple('ScenarioStats', SCENARIO_METRICS)
+
+
+def sample_scenarios(registry, n_scenarios=1000, volatility=0.3, seed=0):
+    """Sample per-entity points scenarios as (entities x scenarios) matrices.
+
+    Each driver and team scores from a normal distribution around its points,
+    with standard deviation from a `points_std` column when the data has one
+    and `volatility` times the mean otherwise.
+    """
+    rng = np.random.default_rng(seed)
+
+    def sample(pool):
+        means = pool.points.astype(float)
+        stds = pool.points_std if pool.points_std is not None else volatility * np.abs(means)
+        noise = rng.standard_normal((len(pool), n_scenarios))
+        return (means[:, None] + stds[:, None] * noise).astype(np.float32)
+
+    return sample(registry.drivers), sample(registry.teams)
+
+
+def scenario_stats(scores):
+    """ScenarioStats arrays for (lineups x scenarios) scores."""
+    percentiles = np.percentile(scores, DOWNSIDE_PERCENTILES, axis=1)
+    return ScenarioStats(scores.mean(axis=1), scores.std(axis=1), *percentiles)
+
+
+def metric_values(scores, metric):
+    """Per-lineup values of a scenario metric, oriented so higher is better."""
+    if metric == 'expected':
+        return scores.mean(axis=1)
+    if metric == 'std':
+        return -scores.std(axis=1)
+    if metric in SCENARIO_METRICS:
+        return np.percentile(scores, int(metric[1:]), axis=1)
+    raise ValueError(f"Unknown scenario metric {metric!r}, expected one of {', '.join(SCENARIO_METRICS)}")
+
+
+@instrumentation.timed
+def find_best_by_scenarios(registry, scenarios, selected_drivers=None, selected_teams=None,
+                           max_cost=100, top_n=5, rank_by='expected', constraints=None):
+    """Best lineups by a scenario metric, scoring every feasible lineup in chunks.
+
+    `scenarios` is the (driver, team) matrix pair from sample_scenarios, with
+    rows indexed by entity id. Each chunk of lineups becomes a 0/1 membership
+    matrix that is multiplied with the scenario matrix in one product. Returns
+    find_best_combinations tuples extended with the lineup's ScenarioStats.
+    Constraints apply as in find_best_combinations.
+    """
+    constraints = constraints or Constraints()
+    drivers, teams = registry.drivers, registry.teams
+    driver_scenarios, team_scenarios = scenarios
+    n_scenarios = driver_scenarios.shape[1]
+
+    driver_pool, driver_picks = split_pool(drivers, selected_drivers, constraints.excluded_drivers)
+    team_pool, team_picks = split_pool(teams, selected_teams, constraints.excluded_teams)
+    constructors, room = constructor_room(drivers, driver_pool, driver_picks, constraints.max_per_constructor)
+    if room is not None and (room < 0).any():
+        return []
+
+    budget = remaining_budget(registry, driver_picks, team_picks, max_cost)
+    min_budget = remaining_budget(registry, driver_picks, team_picks, constraints.min_cost or 0)
+    selected_points = drivers.points[driver_picks].sum() + teams.points[team_picks].sum()
+    selected_scores = driver_scenarios[driver_picks].sum(axis=0) + team_scenarios[team_picks].sum(axis=0)
+
+    # Available drivers then available teams, as columns of the membership matrix
+    pool_scenarios = np.concatenate([driver_scenarios[driver_pool], team_scenarios[team_pool]])
+
+    driver_combos = combination_indices(len(driver_pool), DRIVER_SLOTS - len(selected_drivers or []))
+    if constructors is not None:
+        driver_combos = driver_combos[within_room(driver_combos, constructors, room)]
+    team_combos = combination_indices(len(team_pool), TEAM_SLOTS - len(selected_teams or []))
+    driver_cost = drivers.cost_tenths[driver_pool][driver_combos].sum(axis=1)
+    team_cost = teams.cost_tenths[team_pool][team_combos].sum(axis=1)
+    driver_points = drivers.points[driver_pool][driver_combos].sum(axis=1)
+    team_points = teams.points[team_pool][team_combos].sum(axis=1)
+
+    def lineup_scores(d, t):
+        membership = np.zeros((len(d), len(pool_scenarios)), dtype=np.float32)
+        lineup_rows = np.arange(len(d))[:, None]
+        membership[lineup_rows, driver_combos[d]] = 1
+        membership[lineup_rows, len(driver_pool) + team_combos[t]] = 1
+        return membership @ pool_scenarios + selected_scores
+
+    # Running top candidates as flat driver x team grid positions, kept in
+    # ascending order so ties still break on enumeration order
+    best_flat = np.empty(0, dtype=np.int64)
+    best_values = np.empty(0)
+    scored = 0
+
+    rows_per_chunk = max(1, CHUNK_ELEMENTS // (n_scenarios * max(1, len(team_combos))))
+    for start in range(0, len(driver_combos), rows_per_chunk):
+        rows = slice(start, start + rows_per_chunk)
+        total_cost = driver_cost[rows, None] + team_cost[None, :]
+        d, t = np.nonzero((total_cost <= budget) & (total_cost >= min_budget))
+        if len(d) == 0:
+            continue
+        d += start
+        scored += len(d)
+
+        flat = np.concatenate([best_flat, d * len(team_combos) + t])
+        values = np.concatenate([best_values, metric_values(lineup_scores(d, t), rank_by)])
+        keep = np.sort(top_n_indices(values, top_n))
+        best_flat, best_values = flat[keep], values[keep]
+
+    instrumentation.count(scenario_lineups_scored=scored, scenario_products=scored * n_scenarios)
+
+    if len(best_flat) == 0:
+        return []
+
+    best_flat = best_flat[top_n_indices(best_values, top_n)]
+    d, t = np.divmod(best_flat, len(team_combos))
+    stats = scenario_stats(lineup_scores(d, t))
+
+    return [
+        (
+            tuple(drivers[driver_pool[i]] for i in driver_combos[d[k]]),
+            tuple(teams[team_pool[j]] for j in team_combos[t[k]]),
+            selected_points.item() + driver_points[d[k]].item() + team_points[t[k]].item(),
+            (driver_cost[d[k]] + team_cost[t[k]]).item() / 10,
+            ScenarioStats(*(float(values[k]) for values in stats)),
+        )
+        for k in range(len(d))
+    ]
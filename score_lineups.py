@@ -0,0 +1,203 @@
+import argparse
+import itertools
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from lineup_index import LineupRanks, build_index, open_index
+from lineups import DRIVER_SLOTS, TEAM_SLOTS, to_tenths
+from loaders import load_registry
+from races import DEFAULT_WINDOW, parse_window
+
+DRIVER_COLUMNS = [f'driver_{i}' for i in range(1, DRIVER_SLOTS + 1)]
+TEAM_COLUMNS = [f'team_{i}' for i in range(1, TEAM_SLOTS + 1)]
+CHUNK_SIZE = 10_000
+
+
+def _normalize(names):
+    # Same normalization as load_data, so CSV-style names match too
+    return pd.Series(names, dtype=object).str.replace('_', ' ').str.title()
+
+
+def read_lineups(path, chunk_size=CHUNK_SIZE):
+    """Stream lineups from a CSV or JSONL file in chunks.
+
+    CSV files have driver_1..driver_5 and team_1, team_2 columns; JSONL lines
+    have `drivers` and `teams` lists. Yields (entries, driver names, team
+    names), where entries holds each input row as read, to pass through to
+    the output, and the names are (rows x slots) object arrays.
+    """
+    if path.endswith('.jsonl'):
+        with open(path) as f:
+            while batch := list(itertools.islice(f, chunk_size)):
+                lines = [line for line in batch if line.strip()]
+                if not lines:
+                    continue
+                entries = pd.DataFrame.from_records([json.loads(line) for line in lines])
+                missing = [None] * len(entries)
+                yield (
+                    entries,
+                    _slot_names(entries.get('drivers', missing), DRIVER_SLOTS),
+                    _slot_names(entries.get('teams', missing), TEAM_SLOTS),
+                )
+    else:
+        for entries in pd.read_csv(path, chunksize=chunk_size):
+            yield (
+                entries.reset_index(drop=True),
+                entries.reindex(columns=DRIVER_COLUMNS).to_numpy(dtype=object),
+                entries.reindex(columns=TEAM_COLUMNS).to_numpy(dtype=object),
+            )
+
+
+def _slot_names(lists, slots):
+    # Short lists are padded with None, which then reads as a missing member;
+    # an entry without a list (absent key, null, a bare name) has no members
+    names = np.full((len(lists), slots), None, dtype=object)
+    for row, members in enumerate(lists):
+        members = list(members)[:slots] if isinstance(members, (list, tuple)) else []
+        names[row, :len(members)] = members
+    return names
+
+
+def _lookup(pool, names):
+    """Entity ids for a (rows x slots) array of names, -1 where unknown or missing."""
+    ids = _normalize(names.ravel()).map(pool.ids).fillna(-1).to_numpy(dtype=np.int64)
+    return ids.reshape(names.shape)
+
+
+def _best_swaps(pool, ids, cost, budget):
+    """Best points gain from swapping one member of each lineup for a non-member.
+
+    Returns (slot, replacement id, gain) arrays, with a gain of -inf where no
+    swap fits the budget. Ties go to the earliest slot, then the lowest id.
+    """
+    rows = np.arange(len(ids))[:, None]
+    member = np.zeros((len(ids), len(pool)), dtype=bool)
+    member[rows, ids] = True
+
+    gain = pool.points[None, None, :] - pool.points[ids][:, :, None]
+    swapped_cost = cost[:, None, None] - pool.cost_tenths[ids][:, :, None] + pool.cost_tenths[None, None, :]
+    gain = np.where(~member[:, None, :] & (swapped_cost <= budget), gain, -np.inf)
+
+    flat = gain.reshape(len(ids), -1)
+    best = np.argmax(flat, axis=1)
+    slot, replacement = np.divmod(best, len(pool))
+    return slot, replacement, flat[np.arange(len(ids)), best]
+
+
+def score_chunk(registry, ranks, driver_names, team_names, max_cost=100):
+    """Validate, score, rank and suggest an upgrade for a chunk of lineups.
+
+    Every step is a vectorized lookup over the chunk. Returns a DataFrame
+    with one row per lineup: an error message (empty when valid), cost,
+    points, exact rank and percentile among every lineup under the cap, and
+    the single driver or team swap that adds the most points within budget.
+    """
+    drivers, teams = registry.drivers, registry.teams
+    driver_ids = _lookup(drivers, driver_names)
+    team_ids = _lookup(teams, team_names)
+    budget = int(to_tenths(max_cost))
+
+    def has_duplicates(ids):
+        ordered = np.sort(ids, axis=1)
+        return (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+
+    unknown = (driver_ids < 0).any(axis=1) | (team_ids < 0).any(axis=1)
+    # Unknown members are counted at id 0 below and masked out afterwards
+    driver_ids = np.maximum(driver_ids, 0)
+    team_ids = np.maximum(team_ids, 0)
+    cost = drivers.cost_tenths[driver_ids].sum(axis=1) + teams.cost_tenths[team_ids].sum(axis=1)
+    points = drivers.points[driver_ids].sum(axis=1) + teams.points[team_ids].sum(axis=1)
+
+    error = np.select(
+        [unknown, has_duplicates(driver_ids) | has_duplicates(team_ids), cost > budget],
+        ['unknown or missing driver or team', 'duplicate driver or team', 'over budget'],
+        '',
+    )
+    valid = error == ''
+
+    driver_slot, driver_in, driver_gain = _best_swaps(drivers, driver_ids, cost, budget)
+    team_slot, team_in, team_gain = _best_swaps(teams, team_ids, cost, budget)
+    # Driver swaps win ties
+    use_team = team_gain > driver_gain
+    gain = np.where(use_team, team_gain, driver_gain)
+    has_upgrade = valid & (gain > 0)
+
+    rows = np.arange(len(cost))
+    driver_names_of = np.asarray(drivers.names, dtype=object)
+    team_names_of = np.asarray(teams.names, dtype=object)
+    upgrade_out = np.where(
+        use_team, team_names_of[team_ids[rows, team_slot]], driver_names_of[driver_ids[rows, driver_slot]]
+    )
+    upgrade_in = np.where(use_team, team_names_of[team_in], driver_names_of[driver_in])
+
+    return pd.DataFrame({
+        'error': error,
+        'cost': np.where(unknown, np.nan, cost / 10),
+        'points': np.where(unknown, np.nan, points),
+        'rank': pd.Series(ranks.rank(points), dtype='Int64').where(valid),
+        'percentile': np.where(valid, np.round(ranks.percentile(points), 2), np.nan),
+        'upgrade_out': np.where(has_upgrade, upgrade_out, None),
+        'upgrade_in': np.where(has_upgrade, upgrade_in, None),
+        'upgrade_points': np.where(has_upgrade, gain, np.nan),
+    })
+
+
+def score_lineups(registry, ranks, path, max_cost=100, chunk_size=CHUNK_SIZE):
+    """Score every lineup in a CSV or JSONL file, yielding one DataFrame per chunk.
+
+    Each chunk holds the input rows followed by the score_chunk columns, so
+    memory stays flat however many lineups the file has.
+    """
+    for entries, driver_names, team_names in read_lineups(path, chunk_size):
+        scores = score_chunk(registry, ranks, driver_names, team_names, max_cost)
+        yield pd.concat([entries.drop(columns=scores.columns, errors='ignore'), scores], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a batch of F1 Fantasy lineups from CSV or JSONL.")
+    parser.add_argument('lineups', help="CSV with driver_1..driver_5, team_1, team_2 columns, or JSONL with drivers and teams lists")
+    parser.add_argument('--output', help="output file, CSV or JSONL by extension; defaults to stdout in the input format")
+    parser.add_argument('--budget', type=float, default=100, help="cost cap in millions")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="lineups scored at a time")
+    parser.add_argument('--window', default=DEFAULT_WINDOW,
+                        help="score on stored race results, as FORMULAB_WINDOW for the app: season, last:N, blend:D or baseline")
+    args = parser.parse_args()
+
+    registry = load_registry(window=parse_window(args.window))
+    # Reuse the app's index when it matches; otherwise rank in memory rather than overwrite it
+    index = open_index(registry.digest(), args.budget)
+    if index is None:
+        index = build_index(registry, args.budget)
+    ranks = LineupRanks(index)
+
+    output_path = args.output or args.lineups
+    as_jsonl = output_path.endswith('.jsonl')
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+
+    start = time.perf_counter()
+    scored = 0
+    columns = None
+    try:
+        for chunk in score_lineups(registry, ranks, args.lineups, args.budget, args.chunk_size):
+            if as_jsonl:
+                chunk.to_json(output, orient='records', lines=True)
+            else:
+                # JSONL chunks can carry different keys; CSV rows follow the first chunk's header
+                if columns is None:
+                    columns = chunk.columns
+                chunk.reindex(columns=columns).to_csv(output, header=scored == 0, index=False)
+            scored += len(chunk)
+    finally:
+        if args.output:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {scored:,} lineups in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()